@@ -0,0 +1,47 @@
+"""Upcoming-birthday query: full scan with days_to_birthday vs BirthdayIndex.
+
+Run: python -m exponenta_app.benchmarks.birthdays [N] [DAYS]
+"""
+import sys
+from datetime import date, timedelta
+from random import Random
+from timeit import timeit
+
+from exponenta_app.modules.address_book import AddressBook, DateError, Record
+
+
+def make_book(quantity: int) -> AddressBook:
+    random = Random(quantity)
+    book = AddressBook()
+    for i in range(quantity):
+        rec = Record(f"Contact{i}", f"{i:010d}")
+        rec.add_birthday(date(1950, 1, 1) + timedelta(days=random.randrange(25000)))
+        book.add_record(rec)
+    return book
+
+
+def scan(book: AddressBook, num_days: int) -> list:
+    result = []
+    for rec in book.values():
+        try:
+            days = rec.days_to_birthday()
+        except DateError:
+            continue
+        if days <= num_days:
+            result.append((days, rec))
+    return result
+
+
+def main(quantity: int, num_days: int) -> None:
+    book = make_book(quantity)
+    runs = 5
+    scan_time = timeit(lambda: scan(book, num_days), number=runs) / runs
+    index_time = timeit(lambda: book.upcoming_birthdays(num_days), number=runs) / runs
+    print(f"{quantity} contacts, birthdays in {num_days} days")
+    print(f"scan : {scan_time * 1000:9.3f} ms")
+    print(f"index: {index_time * 1000:9.3f} ms")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [100000, 7][len(args):]))
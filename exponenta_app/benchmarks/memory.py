@@ -0,0 +1,42 @@
+"""Bytes per contact of the Record model.
+
+Run: python -m exponenta_app.benchmarks.memory [N ...]
+"""
+import sys
+import tracemalloc
+from datetime import date
+
+from exponenta_app.modules.address_book import AddressBook, Record
+
+
+def make_record(i: int) -> Record:
+    rec = Record(f"Contact{i}", f"{i:010d}")
+    rec.add_phone(f"{i + 1:010d}")
+    rec.add_adress(f"Street {i % 1000}, {i}")
+    rec.add_birthday(date(1970 + i % 50, i % 12 + 1, i % 28 + 1))
+    rec.add_change_email(f"contact{i}@mail.com")
+    return rec
+
+
+def measure(quantity: int, indexed: bool = False) -> float:
+    tracemalloc.start()
+    if indexed:
+        book = AddressBook()
+        for i in range(quantity):
+            book.add_record(make_record(i))
+    else:
+        book = [make_record(i) for i in range(quantity)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del book
+    return size / quantity
+
+
+def main(sizes: list) -> None:
+    for quantity in sizes:
+        print(f"{quantity:>9} records: {measure(quantity):8.1f} bytes/contact")
+        print(f"{quantity:>9} in book : {measure(quantity, True):8.1f} bytes/contact (with search index)")
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [10**5, 10**6])
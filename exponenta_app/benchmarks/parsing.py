@@ -0,0 +1,45 @@
+"""Parsing throughput of address_book.parcer against the old linear scan.
+
+Run: python -m exponenta_app.benchmarks.parsing [LINES]
+"""
+import sys
+from random import Random
+from timeit import timeit
+
+from exponenta_app.modules.address_book import COMMANDS, parcer, unknown
+
+LINES = [
+    "add Bill 0123456789",
+    "add_phone Bill 0987654321",
+    "add_birthday Bill 01/02/1990",
+    "add_adress Bill Kyiv street 1",
+    "change Bill 0123456789 1111111111",
+    "find 012",
+    "search Kyiv",
+    "birthday 7",
+    "email Bill bill@mail.com",
+    "show_all 20",
+    "close",
+    "wrong command",
+]
+
+
+def linear_parcer(text: str):
+    """parcer before the dispatch table, kept for comparison."""
+    for func, kw in COMMANDS.items():
+        command = text.rstrip().split()
+        if text.lower().startswith(kw) and command[0].lower() in kw:
+            return func, text[len(kw) :].strip().split()
+    return unknown, []
+
+
+def main(quantity: int = 100000) -> None:
+    random = Random(quantity)
+    lines = [random.choice(LINES) for _ in range(quantity)]
+    for label, parse in (("linear scan", linear_parcer), ("dispatch table", parcer)):
+        seconds = timeit(lambda: [parse(line) for line in lines], number=1)
+        print(f"{label:>15}: {quantity / seconds:12,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
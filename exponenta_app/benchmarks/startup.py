@@ -0,0 +1,49 @@
+"""Import time of the app entry point compared with prompt_toolkit alone.
+
+Runs each import in a fresh interpreter with -X importtime.
+
+Run: python -m exponenta_app.benchmarks.startup [RUNS]
+"""
+import subprocess
+import sys
+
+TARGETS = {
+    "prompt_toolkit": "import prompt_toolkit.shortcuts, prompt_toolkit.styles",
+    "exponenta_app": "import exponenta_app.exponenta_main",
+}
+
+
+def import_times(code: str) -> dict:
+    """{module: cumulative microseconds} from one -X importtime run."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nested imports are indented by two more spaces per level
+        times[name[1:]] = int(cumulative)
+    return times
+
+
+def main(runs: int = 5) -> None:
+    for label, code in TARGETS.items():
+        totals = []
+        for _ in range(runs):
+            times = import_times(code)
+            # top level imports only, nested ones are counted in them
+            totals.append(sum(t for name, t in times.items() if not name.startswith(" ")))
+        print(f"{label:>15}: {min(totals) / 1000:8.1f} ms (best of {runs})")
+    slowest = sorted(import_times(TARGETS["exponenta_app"]).items(), key=lambda item: -item[1])
+    print("slowest exponenta_app imports:")
+    for name, cumulative in [item for item in slowest if "exponenta" in item[0]][:5]:
+        print(f"{cumulative / 1000:8.1f} ms  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,252 @@
+"""Benchmark suite for the hot paths of the address book, notebook and sorter.
+
+Synthetic data is generated with a fixed seed in a temporary directory,
+every case is run --repeat times and the results are written to JSON.
+Give --compare an earlier results file to see the change of every case.
+
+Run: python -m exponenta_app.benchmarks.suite [--sizes N ...] [--notes N] [--files N]
+         [--repeat R] [--output FILE] [--compare FILE]
+"""
+import argparse
+from contextlib import contextmanager, redirect_stdout
+from datetime import date, datetime, timedelta
+import io
+import json
+import os
+import platform
+from random import Random
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+import zipfile
+
+from exponenta_app.modules import address_book, note, sort_folders
+from exponenta_app.modules.address_book import AddressBook, Record
+
+QUERIES = 100
+PAGE = 20
+SMALL_FILE = 4 << 10
+LARGE_FILE = 16 << 20
+EXTENSIONS = [
+    ".jpg", ".png", ".mp4", ".mp3", ".txt", ".docx", ".pdf", ".xlsx", ".py", ".xyz",
+]
+WORDS = [
+    "meeting", "project", "budget", "holiday", "report", "client", "invoice",
+    "call", "idea", "travel", "review", "deadline", "family", "book", "music",
+]
+
+
+@contextmanager
+def quiet():
+    with redirect_stdout(io.StringIO()):
+        yield
+
+
+def enter(directory: Path) -> None:
+    directory.mkdir()
+    os.chdir(directory)
+
+
+class Suite:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, name: str, size: int, func, repeat: int = None, setup=None) -> None:
+        runs = []
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            start = perf_counter()
+            func()
+            runs.append(perf_counter() - start)
+        self.results.append({
+            "name": name,
+            "size": size,
+            "min": min(runs),
+            "median": median(runs),
+            "runs": runs,
+        })
+        print(f"{name:<28} {size:>9}  min {min(runs) * 1000:10.2f} ms  median {median(runs) * 1000:10.2f} ms")
+
+
+def make_book(quantity: int, random: Random) -> AddressBook:
+    book = AddressBook()
+    for i in range(quantity):
+        rec = Record(f"Contact{i}", f"{random.randrange(10 ** 10):010}")
+        rec.add_phone(f"{random.randrange(10 ** 10):010}")
+        rec.add_adress(f"Street {random.randrange(1000)}, {i}")
+        rec.add_birthday(date(1950, 1, 1) + timedelta(days=random.randrange(25000)))
+        book.add_record(rec)
+    return book
+
+
+def bench_address_book(suite: Suite, quantity: int) -> None:
+    random = Random(quantity)
+    book = make_book(quantity, random)
+    address_book.phone_book = book
+    queries = [
+        random.choice((f"Contact{random.randrange(quantity)}", f"{random.randrange(1000):03}", "Street 1"))
+        for _ in range(QUERIES)
+    ]
+    suite.run(f"find x{QUERIES}", quantity, lambda: [address_book.find(q) for q in queries])
+    suite.run("birthday_in 7", quantity, lambda: address_book.birthday_in(7))
+    suite.run("iterator first page", quantity, lambda: next(book.iterator(PAGE)))
+    suite.run("iterator all pages", quantity, lambda: sum(1 for _ in book.iterator(PAGE)), repeat=1)
+    book.dirty.clear()
+    suite.run("save_book snapshot", quantity, book.compact)
+    rec = book["Contact0"]
+    suite.run("save_book one change", quantity, book.commit, setup=lambda: rec.add_phone("0123456789"))
+    suite.run("load_book", quantity, lambda: AddressBook().load_book())
+
+
+def bench_notebook(suite: Suite, quantity: int) -> None:
+    random = Random(quantity)
+    with quiet():
+        notebook = note.NoteBook()
+        for i in range(quantity):
+            words = random.choices(WORDS, k=8)
+            notebook.add_note(" ".join(words) + f" #{random.choice(WORDS)}")
+    queries = [" ".join(random.choices(WORDS, k=2)) for _ in range(QUERIES)]
+
+    def search():
+        with quiet():
+            for query in queries:
+                notebook.search_notes(query)
+
+    def change_some():
+        with quiet():
+            for note_id in random.sample(list(notebook.data), min(quantity, QUERIES)):
+                notebook.change_note(note_id, " ".join(random.choices(WORDS, k=8)))
+
+    def save():
+        with quiet():
+            notebook.save_notes()
+
+    def load():
+        with quiet():
+            note.NoteBook()
+
+    suite.run(f"search_notes x{QUERIES}", quantity, search)
+    suite.run("save_notes", quantity, save, setup=change_some)
+    suite.run("load_notes", quantity, load)
+
+
+def write_file(path: Path, size: int, random: Random) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(random.randbytes(size))
+
+
+def make_tree(root: Path, quantity: int, random: Random) -> None:
+    """Many small files in nested folders, a few large ones and archives with an archive inside."""
+    for i in range(quantity):
+        folder = root.joinpath(*[f"dir{random.randrange(8)}" for _ in range(random.randrange(4))])
+        write_file(folder / f"file{i}{random.choice(EXTENSIONS)}", random.randrange(SMALL_FILE), random)
+    for i in range(3):
+        write_file(root / f"large{i}{random.choice(EXTENSIONS)}", LARGE_FILE, random)
+    for i in range(max(quantity // 500, 1)):
+        inner = root / f"inner{i}.tar.gz"
+        with tarfile.open(inner, "w:gz") as tar:
+            for j in range(20):
+                data = random.randbytes(SMALL_FILE)
+                info = tarfile.TarInfo(f"docs/part{j}.txt")
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        root.joinpath(f"dir{i % 8}").mkdir(exist_ok=True)
+        with zipfile.ZipFile(root / f"dir{i % 8}" / f"archive{i}.zip", "w") as archive:
+            archive.write(inner, inner.name)
+            for j in range(20):
+                archive.writestr(f"photos/img{j}.jpg", random.randbytes(SMALL_FILE))
+        inner.unlink()
+
+
+def bench_sorter(suite: Suite, quantity: int, workdir: Path) -> None:
+    source = workdir / "tree"
+    target = workdir / "sort"
+    make_tree(source, quantity, Random(quantity))
+
+    def fresh_copy():
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree(source, target)
+
+    def legacy():
+        report = sort_folders.sort_folder(target)
+        sort_folders.delete_empty_folders(target)
+        sort_folders.write_in_file(report.files, report.exts, target)
+
+    suite.run("sort_folder+delete+write", quantity, legacy, setup=fresh_copy)
+    suite.run("sort_path", quantity, lambda: sort_folders.sort_path(target, incremental=False), setup=fresh_copy)
+    shutil.rmtree(source)
+    shutil.rmtree(target)
+
+
+def git_commit() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def compare(results: list, old_file: Path) -> None:
+    old = {(r["name"], r["size"]): r["min"] for r in json.loads(old_file.read_text())["results"]}
+    print(f"\nChange against {old_file} (min times):")
+    for result in results:
+        before = old.get((result["name"], result["size"]))
+        if before:
+            print(f"{result['name']:<28} {result['size']:>9}  {result['min'] / before - 1:+8.1%}")
+
+
+def main(argv: list = None) -> None:
+    args_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args_parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 3, 10 ** 4, 10 ** 5],
+                             help="contacts in the books, up to 10**6")
+    args_parser.add_argument("--notes", type=int, default=10 ** 4)
+    args_parser.add_argument("--files", type=int, default=2000, help="small files in the sorted tree")
+    args_parser.add_argument("--repeat", type=int, default=3)
+    args_parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"))
+    args_parser.add_argument("--compare", type=Path, metavar="FILE")
+    args = args_parser.parse_args(argv)
+    args.output = args.output.resolve()
+
+    suite = Suite(args.repeat)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # the stores write to the current directory
+        os.chdir(workdir)
+        try:
+            for quantity in args.sizes:
+                # every size gets its own stores, sync() would merge a shared phone_book.bin in
+                enter(Path(workdir, f"book{quantity}"))
+                bench_address_book(suite, quantity)
+            if args.notes:
+                enter(Path(workdir, "notes"))
+                bench_notebook(suite, args.notes)
+            if args.files:
+                bench_sorter(suite, args.files, Path(workdir))
+        finally:
+            os.chdir(cwd)
+
+    args.output.write_text(json.dumps({
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": suite.results,
+    }, indent=2))
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(suite.results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Phone and email validation one Field at a time against whole columns.
+
+Run: python -m exponenta_app.benchmarks.validation [VALUES]
+"""
+import sys
+from random import Random
+from timeit import timeit
+
+from exponenta_app.modules.address_book import Email, Phone
+from exponenta_app.modules.validation import bad_emails, canonical_phones
+
+
+def per_object(phones: list, emails: list) -> None:
+    for field, values in ((Phone, phones), (Email, emails)):
+        for value in values:
+            try:
+                field(value)
+            except ValueError:
+                pass
+
+
+def batch(phones: list, emails: list) -> None:
+    canonical_phones(phones)
+    bad_emails(emails)
+
+
+def main(quantity: int = 200000) -> None:
+    random = Random(quantity)
+    digits = [f"{random.randrange(10 ** 10):010}" for _ in range(quantity)]
+    # half of the phones are written with separators
+    phones = [d if i % 2 else f"({d[:3]}) {d[3:6]}-{d[6:]}" for i, d in enumerate(digits)]
+    emails = [f"user{i}@mail.com" for i in range(quantity)]
+    # one bad value, so the columns are checked one by one too
+    phones[-1] = "12345"
+    emails[-1] = "not an email"
+    for label, validate in (("per object", per_object), ("batch", batch)):
+        seconds = timeit(lambda: validate(phones, emails), number=1)
+        print(f"{label:>10}: {2 * quantity / seconds:12,.0f} values/s")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
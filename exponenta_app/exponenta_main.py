@@ -1,7 +1,7 @@
 from prompt_toolkit.shortcuts import radiolist_dialog
 from prompt_toolkit.styles import Style
 
-from .modules import addressbook_main, note_main, sort_main
+from . import modules
 
 
 def main():
@@ -29,11 +29,11 @@ What would you like to do ? ''',
         ).run()
         print(result)
         if result == "addressbook":
-            addressbook_main()
+            modules.addressbook_main()
         elif result == "notebook":
-            note_main()
+            modules.note_main()
         elif result == "sort":
-            sort_main()
+            modules.sort_main()
 
 
 if __name__ == "__main__":
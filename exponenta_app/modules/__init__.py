@@ -1,5 +1,17 @@
-from .address_book import addressbook_main
-from .note import note_main
-from .sort_folders import sort_main
+from importlib import import_module
 
-__all__ = ['addressbook_main', 'note_main', 'sort_main']
\ No newline at end of file
+# sub-modules pull in prompt_toolkit completers and their stores,
+# so they are imported only when their entry point is used
+ENTRY_POINTS = {
+    'addressbook_main': '.address_book',
+    'note_main': '.note',
+    'sort_main': '.sort_folders',
+}
+
+__all__ = ['addressbook_main', 'note_main', 'sort_main']
+
+
+def __getattr__(name):
+    if name in ENTRY_POINTS:
+        return getattr(import_module(ENTRY_POINTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
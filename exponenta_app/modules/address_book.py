@@ -1,14 +1,24 @@
 from abc import ABC, abstractmethod
-from collections import UserDict
+from bisect import bisect_left
+from calendar import isleap
+from collections import UserDict, defaultdict
 from pathlib import Path
-from datetime import date, datetime
-from itertools import islice
-import re
+from datetime import date, datetime, timedelta
+import os
 import pickle
 from prompt_toolkit.completion import NestedCompleter
 from prompt_toolkit import prompt
 
+from . import metrics
+from .commands import build_dispatch, split_command
+from .locking import file_lock, file_stamp
+from .validation import PHONE_SEPARATORS, canonical_phone, is_email
+
 save_file = Path("phone_book.bin")
+journal_file = Path("phone_book.log")
+lock_file = Path("phone_book.lock")
+COMPACT_EVERY = 1000
+PAGE_SIZE = 20
 
 help_message = """Use next commands:
     <add> 'name' 'phone'                - add name and phone number (10 digits) to the dictionary
@@ -30,6 +40,12 @@ help_message = """Use next commands:
     <remove_phone> 'name' 'phone'       - remove phone for this name
     <show_all>                          -  show all records in the dictionary
     <show_all> 'N'                      - show records by N records on page
+    <show_all> 'N' page 'K'             - show records by N records on page from page K
+    <show_all> 'N' from 'str'           - show records by N records on page from name 'str'
+    <migrate>                           - rewrite phone book file in the current format
+    <stats> or <stats> prometheus       - command latencies, errors and storage traffic (EXPONENTA_METRICS)
+    <import> 'file.csv' or 'file.vcf'   - add contacts from a CSV or vCard file
+    <export> 'file.csv' or 'file.vcf'   - save all contacts to a CSV or vCard file
     <exit> or <close> or <good_bye>     - exit from module"""
 
 greeting_message = """Welcome to Address Book.
@@ -56,6 +72,9 @@ class PhoneError(Exception):
 
 
 class Field:
+    __slots__ = ("__value",)
+    state_slot = "_Field__value"
+
     def __init__(self, value):
         self.__value = None
         self.value = value
@@ -71,16 +90,33 @@ class Field:
     def __str__(self):
         return str(self.value)
 
+    @classmethod
+    def restore(cls, value):
+        """Field with a value that was validated before, e.g. when it was saved."""
+        field = cls.__new__(cls)
+        setattr(field, cls.state_slot, value)
+        return field
+
+    def __setstate__(self, state):
+        # pickles made before __slots__ carry a plain __dict__ state
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        for key, value in state.items():
+            setattr(self, key, value)
+
 
 class Name(Field):
-    ...
+    __slots__ = ()
 
 
 class Adress(Field):
-    ...
+    __slots__ = ()
 
 
 class Email(Field):
+    __slots__ = ("__email",)
+    state_slot = "_Email__email"
+
     def __init__(self, email: str):
         self.__email = None
         self.email = email
@@ -91,7 +127,7 @@ class Email(Field):
 
     @email.setter
     def email(self, email: str):
-        if re.match(r"[A-z.]+\w+@[A-z]+\.[A-Za-z]{2,}", email):
+        if is_email(email):
             self.__email = email
         else:
             raise ValueError(
@@ -103,6 +139,9 @@ class Email(Field):
 
 
 class Birthday(Field):
+    __slots__ = ("__birthday",)
+    state_slot = "_Birthday__birthday"
+
     def __init__(self, birthday) -> None:
         self.__birthday = None
         self.birthday = birthday
@@ -113,16 +152,19 @@ class Birthday(Field):
 
     @birthday.setter
     def birthday(self, birthday):
-        if isinstance(birthday, datetime):
-            self.birthday = birthday
+        if isinstance(birthday, date):
+            self.__birthday = birthday
         else:
             raise DateError()
 
     def __str__(self):
-        return f"Days to birthday: {self.days_to_birthday}"
+        return self.__birthday.strftime("%d/%m/%Y")
 
 
 class Phone(Field):
+    __slots__ = ("__phone",)
+    state_slot = "_Phone__phone"
+
     def __init__(self, phone: str):
         self.__phone = None
         self.phone = phone
@@ -133,13 +175,26 @@ class Phone(Field):
 
     @phone.setter
     def phone(self, phone: str):
-        if re.match(r"[0-9]{10}", phone):
-            self.__phone = phone
-        else:
-            raise ValueError("Wrong phone format. It must contains 10 digits")
+        self.__phone = canonical_phone(phone)
+
+    def __str__(self):
+        return f"{self.__phone}"
+
+
+def next_birthday(birthday: date, today: date) -> date:
+    """Nearest birthday from today on; Feb 29 falls on Feb 28 in non-leap years."""
+    for year in (today.year, today.year + 1):
+        try:
+            future_bd = birthday.replace(year=year)
+        except ValueError:
+            future_bd = date(year, 2, 28)
+        if future_bd >= today:
+            return future_bd
 
 
 class Record:
+    __slots__ = ("name", "phones", "birthday", "email", "adress", "book", "version")
+
     def __init__(
         self,
         name,
@@ -153,6 +208,8 @@ class Record:
         self.birthday = None
         self.email = None
         self.adress = None
+        self.book = None
+        self.version = 0
         if phone:
             self.phones.append(Phone(phone))
         if birthday_date:
@@ -160,13 +217,47 @@ class Record:
         if email:
             self.email = Email(email)
 
+    def __getstate__(self):
+        # plain values pickle much faster than Field objects
+        return (
+            self.name.value,
+            [p.phone for p in self.phones],
+            self.birthday,
+            self.email.email if self.email else None,
+            self.adress.value if self.adress else None,
+            self.version,
+        )
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # pickles made before __slots__ carry a plain __dict__ state
+            state = tuple(
+                state.get(key) for key in ("name", "phones", "birthday", "email", "adress")
+            )
+        name, phones, self.birthday, email, adress = state[:5]
+        # version stamps came with concurrent sessions
+        self.version = state[5] if len(state) > 5 else 0
+        if isinstance(name, str):
+            name = Name.restore(name)
+            phones = [Phone.restore(phone) for phone in phones]
+            email = Email.restore(email) if email is not None else None
+            adress = Adress.restore(adress) if adress is not None else None
+        self.name, self.phones, self.email, self.adress = name, phones or [], email, adress
+        self.book = None
+
+    def changed(self) -> None:
+        if self.book is not None:
+            self.book.record_changed(self)
+
     def add_phone(self, phone: str) -> str:
         self.phones.append(Phone(phone))
+        self.changed()
         return f"Added phone {phone} to contact {self.name}"
 
 
     def add_adress(self, adress: str):
         self.adress = Adress(adress)
+        self.changed()
 
     def show_adress(self) -> str:
         if self.adress:
@@ -176,13 +267,16 @@ class Record:
 
     def del_adress(self) -> None:
         self.adress = None
+        self.changed()
 
 
     def add_birthday(self, bd_date) -> None:
         self.birthday = bd_date
+        self.changed()
 
     def find_phone(self, phone: str) -> Phone:
         result = None
+        phone = phone.translate(PHONE_SEPARATORS)
         for p in self.phones:
             if phone in p.phone:
                 result = p
@@ -198,36 +292,34 @@ class Record:
         search = self.find_phone(phone)
         if search in self.phones:
             self.phones.remove(search)
+            self.changed()
             return f"Removed phone {phone} from contact {self.name}."
         else:
             raise PhoneError
 
     def edit_phone(self, phone: str, new_phone: str) -> str:
         edit_check = False
+        phone = phone.translate(PHONE_SEPARATORS)
         for i in range(len(self.phones)):
-            if self.phones[i].value == phone:
+            if self.phones[i].phone == phone:
                 edit_check = True
                 self.phones[i] = Phone(new_phone)
+                self.changed()
                 return f"Changed phone {phone} for contact {self.name} to {new_phone}"
         if not edit_check:
             raise ValueError
 
-    def days_to_birthday(self) -> int:
+    def days_to_birthday(self, today: date = None) -> int:
         if self.birthday:
-            now_date = date.today()
-            future_bd = self.birthday
-            future_bd = future_bd.replace(year=now_date.year)
-            if future_bd > now_date:
-                return (future_bd - now_date).days
-            else:
-                future_bd = future_bd.replace(year=future_bd.year + 1)
-                return (future_bd - now_date).days
+            now_date = today or date.today()
+            return (next_birthday(self.birthday, now_date) - now_date).days
         else:
             raise DateError()
 
     def add_change_email(self, email: str = None) -> str:
         if email:
             self.email = Email(email)
+            self.changed()
             return (
                 f"Email for contact {self.name} was succefully changed to {self.email}"
             )
@@ -243,48 +335,427 @@ class Record:
         )
 
 
+class SearchIndex:
+    """Trigram index over names, adresses and phone digits of the records."""
+
+    def __init__(self):
+        self.text = defaultdict(set)
+        self.phones = defaultdict(set)
+        self.grams = {}
+
+    @staticmethod
+    def trigrams(text: str) -> set:
+        return {text[i : i + 3] for i in range(len(text) - 2)}
+
+    def add(self, rec: Record) -> None:
+        name = rec.name.value
+        self.remove(name)
+        text_grams = self.trigrams(name.lower())
+        if rec.adress:
+            text_grams |= self.trigrams(str(rec.adress).lower())
+        phone_grams = set()
+        for p in rec.phones:
+            phone_grams |= self.trigrams(p.phone)
+        for gram in text_grams:
+            self.text[gram].add(name)
+        for gram in phone_grams:
+            self.phones[gram].add(name)
+        self.grams[name] = (text_grams, phone_grams)
+
+    def remove(self, name: str) -> None:
+        if name not in self.grams:
+            return
+        text_grams, phone_grams = self.grams.pop(name)
+        for table, grams in ((self.text, text_grams), (self.phones, phone_grams)):
+            for gram in grams:
+                names = table[gram]
+                names.discard(name)
+                if not names:
+                    del table[gram]
+
+    def clear(self) -> None:
+        self.text.clear()
+        self.phones.clear()
+        self.grams.clear()
+
+    @staticmethod
+    def lookup(table: dict, grams: set) -> set:
+        postings = sorted((table.get(g, set()) for g in grams), key=len)
+        if not postings or not postings[0]:
+            return set()
+        result = set(postings[0])
+        for names in postings[1:]:
+            result &= names
+            if not result:
+                break
+        return result
+
+    def candidates(self, search: str, phones: bool = True, text: bool = True):
+        """Names that may contain 'search', or None if it is too short to use the index."""
+        # phones are indexed as digits, find_phone drops the separators too
+        digits = search.translate(PHONE_SEPARATORS)
+        if len(search) < 3 or (phones and len(digits) < 3):
+            return None
+        result = set()
+        if text:
+            result |= self.lookup(self.text, self.trigrams(search.lower()))
+        if phones:
+            result |= self.lookup(self.phones, self.trigrams(digits))
+        return result
+
+
+class BirthdayIndex:
+    """Names of the records grouped by (month, day) of birthday."""
+
+    def __init__(self):
+        self.days = defaultdict(set)
+        self.keys = {}
+
+    def add(self, rec: Record) -> None:
+        name = rec.name.value
+        self.remove(name)
+        if rec.birthday:
+            key = (rec.birthday.month, rec.birthday.day)
+            self.days[key].add(name)
+            self.keys[name] = key
+
+    def remove(self, name: str) -> None:
+        key = self.keys.pop(name, None)
+        if key:
+            names = self.days[key]
+            names.discard(name)
+            if not names:
+                del self.days[key]
+
+    def clear(self) -> None:
+        self.days.clear()
+        self.keys.clear()
+
+    def upcoming(self, num_days: int, today: date = None) -> list:
+        """(days, name) pairs for birthdays in the next num_days, nearest first."""
+        result = []
+        for key, offset in upcoming_days(num_days, today).items():
+            result.extend((offset, name) for name in self.days.get(key, ()))
+        return sorted(result)
+
+
+def upcoming_days(num_days: int, today: date = None) -> dict:
+    """{(month, day): days from today} for the next num_days; Feb 29 counts on Feb 28 in non-leap years."""
+    today = today or date.today()
+    days = {}
+    for offset in range(min(num_days, 366) + 1):
+        day = today + timedelta(days=offset)
+        days.setdefault((day.month, day.day), offset)
+        if (day.month, day.day) == (2, 28) and not isleap(day.year):
+            days.setdefault((2, 29), offset)
+    return days
+
+
+class Pager:
+    """Cursor over the records of a book in name order.
+
+    The cursor is the name the next page starts from, so records added or
+    deleted between pages do not shift it, and only the records of the
+    requested page are formatted.
+    """
+
+    def __init__(self, book, page_size: int = 20):
+        self.book = book
+        self.page_size = max(page_size, 1)
+        self.start = ""
+
+    def seek_page(self, page: int) -> None:
+        """Move to page number 'page', counting from 1."""
+        self.start = self.book.name_at((max(page, 1) - 1) * self.page_size)
+
+    def seek_name(self, prefix: str) -> None:
+        """Move to the first record whose name is not less than prefix."""
+        self.start = prefix
+
+    def page_number(self) -> int:
+        position = len(self.book) if self.start is None else self.book.position_of(self.start)
+        return position // self.page_size + 1
+
+    def next_page(self) -> list:
+        """Formatted records of the page at the cursor; [] after the last one."""
+        if self.start is None:
+            return []
+        names = self.book.names_from(self.start, self.page_size + 1)
+        self.start = names[self.page_size] if len(names) > self.page_size else None
+        return [str(self.book[name]) for name in names[: self.page_size]]
+
+    def __iter__(self):
+        while page := self.next_page():
+            yield page
+
+
 class AddressBook(UserDict):
     def __init__(self, data=None):
+        self.index = SearchIndex()
+        self.birthdays = BirthdayIndex()
+        self.dirty = set()
+        self.journal_entries = 0
+        # versions of the records on disk as of the last sync, deleted ones too
+        self.versions = {}
+        # names whose version in self.versions is a deletion
+        self.deleted = set()
+        self.snapshot_stamp = None
+        self.journal_offset = 0
+        self.conflicts = []
+        self.names = None
         super().__init__(data)
-        self.counter = 0
+
+    def __setitem__(self, name: str, rec: Record):
+        if name not in self.data:
+            self.names = None
+        self.data[name] = rec
+        rec.book = self
+        self.index.add(rec)
+        self.birthdays.add(rec)
+        self.dirty.add(name)
+
+    def __delitem__(self, name: str):
+        rec = self.data.pop(name)
+        rec.book = None
+        self.names = None
+        self.index.remove(name)
+        self.birthdays.remove(name)
+        self.dirty.add(name)
+
+    def record_changed(self, rec: Record) -> None:
+        self.index.add(rec)
+        self.birthdays.add(rec)
+        self.dirty.add(rec.name.value)
+
+    def rebuild_index(self) -> None:
+        self.names = None
+        self.index.clear()
+        self.birthdays.clear()
+        for rec in self.data.values():
+            rec.book = self
+            self.index.add(rec)
+            self.birthdays.add(rec)
 
     def add_record(self, rec: Record):
         if rec.name.value not in self.data.keys():
-            self.data[rec.name.value] = rec
+            self[rec.name.value] = rec
         else:
             raise ValueError
 
     def find(self, name: str) -> Record:
-        for k in self.data.keys():
-            if name in k:
-                return self.data.get(name)
-        else:
-            return None
+        return self.data.get(name)
 
     def delete(self, name: str):
         if name in self.data.keys():
-            return self.data.pop(name)
-
-    def iterator(self, quantity=None) -> list:
-        self.counter = 0
-        values = list(map(str, islice(self.data.values(), None)))
-        while self.counter < len(values):
-            if quantity:
-                yield values[self.counter : self.counter + quantity]
-                self.counter += quantity
+            return self.pop(name)
+
+    def upcoming_birthdays(self, num_days: int, today: date = None) -> list:
+        return [
+            (days, self.data[name])
+            for days, name in self.birthdays.upcoming(num_days, today)
+        ]
+
+    def search(self, search: str, phones: bool = True, text: bool = True):
+        names = self.index.candidates(search, phones, text)
+        if names is None:
+            return self.data.values()
+        return [self.data[name] for name in sorted(names)]
+
+    def sorted_names(self) -> list:
+        """Names of the records in order, sorted again only after names change."""
+        if self.names is None:
+            self.names = sorted(self.data)
+        return self.names
+
+    def names_from(self, start: str, count: int) -> list:
+        """Up to count names in order, from the first one not less than start."""
+        names = self.sorted_names()
+        position = bisect_left(names, start)
+        return names[position : position + count]
+
+    def name_at(self, position: int):
+        names = self.sorted_names()
+        return names[position] if position < len(names) else None
+
+    def position_of(self, name: str) -> int:
+        return bisect_left(self.sorted_names(), name)
+
+    def iterator(self, quantity=None):
+        """Pages of formatted records in name order, each formatted when it is reached."""
+        return iter(Pager(self, quantity or PAGE_SIZE))
+
+    def disk_changed(self) -> bool:
+        """Whether another session wrote the book since the last sync."""
+        journal_size = journal_file.stat().st_size if journal_file.exists() else 0
+        return file_stamp(save_file) != self.snapshot_stamp or journal_size != self.journal_offset
+
+    def sync(self) -> None:
+        """Merge the records other sessions wrote since the last sync; call with the lock held.
+
+        A record changed here and in another session is a conflict: the
+        other session's version is kept and the name goes to self.conflicts.
+        """
+        if file_stamp(save_file) != self.snapshot_stamp:
+            # another session compacted the book, compare with all of it
+            self.snapshot_stamp = file_stamp(save_file)
+            self.journal_offset = 0
+            self.journal_entries = 0
+            changes = {name: (rec, rec.version) for name, rec in self.read_snapshot().items()}
+            changes.update(self.read_journal())
+            for name, version in self.versions.items():
+                # compaction drops deletions, the ones already synced stay as they are
+                if name not in changes and name not in self.deleted:
+                    changes[name] = (None, version + 1)
+        else:
+            changes = self.read_journal()
+        for name, (rec, version) in changes.items():
+            if version == self.versions.get(name):
+                continue
+            self.versions[name] = version
+            if rec is None:
+                self.deleted.add(name)
             else:
-                yield values
-                break
+                self.deleted.discard(name)
+            if name in self.dirty:
+                self.dirty.discard(name)
+                if rec is None and name not in self.data:
+                    # deleted in both sessions
+                    continue
+                self.conflicts.append(name)
+            if rec is not None:
+                self[name] = rec
+            elif name in self.data:
+                del self[name]
+            self.dirty.discard(name)
+
+    def stamp_dirty(self) -> list:
+        """Journal entry of the changed records with their next versions."""
+        entry = []
+        for name in self.dirty:
+            version = self.versions.get(name, 0) + 1
+            rec = self.data.get(name)
+            if rec is not None:
+                rec.version = version
+                self.deleted.discard(name)
+            else:
+                self.deleted.add(name)
+            self.versions[name] = version
+            entry.append((name, rec, version))
+        self.dirty.clear()
+        return entry
+
+    @metrics.timed_storage("phone_book.commit")
+    def commit(self) -> list:
+        """Merge the changes of other sessions and append ours to the journal.
+
+        Returns the names of the records that were changed in another
+        session too; their other version is kept.
+        """
+        if self.dirty or self.disk_changed():
+            with file_lock(lock_file):
+                self.sync()
+                if self.dirty:
+                    entry = pickle.dumps(self.stamp_dirty())
+                    metrics.add_bytes("phone_book", "written", len(entry))
+                    with open(journal_file, "ab") as file:
+                        file.write(entry)
+                        file.flush()
+                        os.fsync(file.fileno())
+                        self.journal_offset = file.tell()
+                    self.journal_entries += 1
+                if self.journal_entries >= COMPACT_EVERY:
+                    self.write_snapshot()
+        conflicts, self.conflicts = self.conflicts, []
+        return conflicts
+
+    @metrics.timed_storage("phone_book.compact")
+    def compact(self) -> None:
+        """Write a full snapshot and start a new journal."""
+        with file_lock(lock_file):
+            self.sync()
+            self.write_snapshot()
+
+    def write_snapshot(self) -> None:
+        self.stamp_dirty()
+        tmp_file = save_file.with_suffix(".tmp")
+        with open(tmp_file, "wb") as file:
+            pickle.dump(self.data, file)
+            file.flush()
+            os.fsync(file.fileno())
+            metrics.add_bytes("phone_book", "written", file.tell())
+        os.replace(tmp_file, save_file)
+        journal_file.unlink(missing_ok=True)
+        self.snapshot_stamp = file_stamp(save_file)
+        self.journal_offset = 0
+        self.journal_entries = 0
+
+    @staticmethod
+    def read_snapshot() -> dict:
+        if save_file.exists() and save_file.stat().st_size > 0:
+            with open(save_file, "rb") as file:
+                data = file.read()
+            metrics.add_bytes("phone_book", "read", len(data))
+            return pickle.loads(data)
+        return {}
+
+    def read_journal(self) -> dict:
+        """{name: (record or None, version)} written to the journal after self.journal_offset."""
+        changes = {}
+        if not journal_file.exists():
+            return changes
+        start = self.journal_offset
+        with open(journal_file, "r+b") as file:
+            file.seek(start)
+            while True:
+                position = file.tell()
+                try:
+                    entry = pickle.load(file)
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    # end of the journal or a torn write left by a crash
+                    file.truncate(position)
+                    break
+                for name, rec, *version in entry:
+                    # entries written before version stamps have no version
+                    version = version[0] if version else rec.version if rec else 0
+                    changes[name] = (rec, version)
+                self.journal_entries += 1
+        self.journal_offset = position
+        metrics.add_bytes("phone_book", "read", position - start)
+        return changes
+
+    def migrate_book(self) -> str:
+        """Load a book saved in any earlier format and rewrite it in the current one."""
+        self.load_book()
+        self.compact()
+        return f"Phonebook migrated, {len(self.data)} records"
 
     def save_book(self) -> str:
-        with open(save_file, "wb") as file:
-            pickle.dump(self.data, file)
+        self.commit()
         return f"Phonebook saved. Good bye!"
 
+    @staticmethod
+    def stored() -> bool:
+        return save_file.exists() and save_file.stat().st_size > 0 or journal_file.exists()
+
+    @metrics.timed_storage("phone_book.load")
     def load_book(self) -> str:
-        with open(save_file, "rb") as file:
-            data = file.read()
-            self.data = pickle.loads(data)
+        with file_lock(lock_file):
+            self.snapshot_stamp = file_stamp(save_file)
+            self.data = self.read_snapshot()
+            self.journal_offset = 0
+            self.journal_entries = 0
+            self.versions = {name: rec.version for name, rec in self.data.items()}
+            self.deleted = set()
+            for name, (rec, version) in self.read_journal().items():
+                self.versions[name] = version
+                if rec is None:
+                    self.data.pop(name, None)
+                    self.deleted.add(name)
+                else:
+                    self.data[name] = rec
+        self.rebuild_index()
+        self.dirty.clear()
+        self.conflicts = []
         return f"Phonebook loaded"
 
 
@@ -292,17 +763,23 @@ def input_error(func):
     def inner(*args):
         try:
             return func(*args)
-        except TypeError:
+        except TypeError as e:
+            metrics.error(e)
             return "Not enough params. Try again"
-        except KeyError:
+        except KeyError as e:
+            metrics.error(e)
             return "Unknown name. Try again"
-        except ValueError:
+        except ValueError as e:
+            metrics.error(e)
             return "Wrong format. Try again"  
-        except DateError:
+        except DateError as e:
+            metrics.error(e)
             return "Birthday date error or no birthday data"
-        except IndexError:
+        except IndexError as e:
+            metrics.error(e)
             return "Not enough params. Try again"
-        except PhoneError:
+        except PhoneError as e:
+            metrics.error(e)
             return "This phone number doesn't exist in the dictionary."
 
     return inner
@@ -345,18 +822,22 @@ def days_to_birthday(*args) -> str:
 @input_error
 def birthday_in(*args) -> str:
     num_days = int(args[0])
-    for name in phone_book:
-        rec = phone_book.get(name)
-        try:
-            days = rec.days_to_birthday()
-            if days <= num_days:
-                print(f"{rec} birthday in {days} days")
-        except DateError:
-            continue
-    return f"Our birthday people in {num_days} days"
+    result = [f"Our birthday people in {num_days} days"]
+    for days, rec in phone_book.upcoming_birthdays(num_days):
+        result.append(f"{rec} birthday in {days} days")
+    return "\n".join(result)
 
 
-phone_book = AddressBook()
+def open_book() -> AddressBook:
+    """The book in the storage chosen by EXPONENTA_STORAGE: pickle files (default) or sqlite."""
+    if os.environ.get("EXPONENTA_STORAGE") == "sqlite":
+        from .address_sql import SqliteAddressBook
+
+        return SqliteAddressBook()
+    return AddressBook()
+
+
+phone_book = open_book()
 
 
 def find_name(args: str) -> str:
@@ -437,17 +918,37 @@ def remove_phone(*args):
 def find(search: str) -> str:
     rec = []
     if search.isdigit():
-        for k, v in phone_book.items():
+        for v in phone_book.search(search):
             if v.find_phone(search) or search.lower() in str(
                 v.find_adress(search.lower())
             ):
-                rec.append(phone_book[k])
+                rec.append(v)
     else:
-        for k, v in phone_book.items():
-            if search.lower() in k.lower() or search.lower() in str(
+        for v in phone_book.search(search, phones=False):
+            if search.lower() in v.name.value.lower() or search.lower() in str(
                 v.find_adress(search.lower())
             ):
-                rec.append(phone_book[k])
+                rec.append(v)
+    if rec:
+        result = "\n".join(list(map(str, rec)))
+        return f"Finded \n{result}"
+    else:
+        return f"Nothing was found for your request."
+
+
+@input_error
+def search(*args) -> str:
+    search = " ".join(args)
+    if len(search) < 3:
+        return "Search string must contain at least 3 symbols"
+    rec = []
+    for v in phone_book.search(search):
+        if (
+            search.lower() in v.name.value.lower()
+            or v.find_phone(search)
+            or search.lower() in str(v.adress).lower()
+        ):
+            rec.append(v)
     if rec:
         result = "\n".join(list(map(str, rec)))
         return f"Finded \n{result}"
@@ -455,21 +956,46 @@ def find(search: str) -> str:
         return f"Nothing was found for your request."
 
 
+# False when commands come from a script, show_all then prints every page without asking
+interactive = True
+
+
+@input_error
 def show_all(*args):
-    try:
-        if args[0]:
-            for rec in phone_book.iterator(int(args[0])):
-                UserInterface().show_data("\n".join([str(r) for r in rec]))
-                input("Press Enter for next records")
-    except:
-        for rec in phone_book.iterator():
-            UserInterface().show_data("\n".join([str(r) for r in rec]))
+    if not args:
+        for page in phone_book.iterator():
+            UserInterface().show_data("\n".join(page))
+        return
+    pager = Pager(phone_book, int(args[0]))
+    if len(args) > 2 and args[1] == "page":
+        pager.seek_page(int(args[2]))
+    elif len(args) > 2 and args[1] == "from":
+        pager.seek_name(" ".join(args[2:]))
+    if pager.start is None:
+        return "There are no records on this page"
+    while page := pager.next_page():
+        UserInterface().show_data("\n".join(page))
+        if pager.start is None:
+            break
+        if not interactive:
+            continue
+        try:
+            answer = input(f"Page {pager.page_number() - 1}. Press Enter for next records or q to stop ")
+        except EOFError:
+            # no one to press Enter, e.g. in a batch run
+            break
+        if answer.strip().lower() == "q":
+            break
 
 
 def save_book() -> str:
     return phone_book.save_book()
 
 
+def stats(*args) -> str:
+    return metrics.report(*args[:1])
+
+
 def load_book() -> str:
     return phone_book.load_book()
 
@@ -504,6 +1030,34 @@ def remove_adr(*args):
         raise KeyError()
 
 
+def migrate_book() -> str:
+    return phone_book.migrate_book()
+
+
+def import_contacts(*args) -> str:
+    from .address_io import import_file
+
+    if not args:
+        return "Not enough params. Try again"
+    try:
+        result = import_file(phone_book, Path(" ".join(args)))
+    except (OSError, ValueError) as e:
+        return f"Import failed: {e}"
+    return str(result)
+
+
+def export_contacts(*args) -> str:
+    from .address_io import export_file
+
+    if not args:
+        return "Not enough params. Try again"
+    try:
+        count = export_file(phone_book, Path(" ".join(args)))
+    except (OSError, ValueError) as e:
+        return f"Export failed: {e}"
+    return f"Exported {count} contacts"
+
+
 def stop_command(*_):
     return phone_book.save_book()
 
@@ -524,32 +1078,51 @@ COMMANDS = {
     delete_record: "delete_record",
     days_to_birthday: "days_to_birthday",
     find: "find",
+    search: "search",
     help: "help",
     show_all: "show_all",
     save_book: "save",
     load_book: "load",
+    migrate_book: "migrate",
+    import_contacts: "import",
+    export_contacts: "export",
     remove_phone: "delete_phone",
     remove_adr: "delete_adr",
     stop_command: ("good_bye", "close", "exit", "stop"),
     add_change_email: "email",
+    stats: "stats",
 }
 
 
+DISPATCH = build_dispatch({metrics.timed_command(kw, func): kw for func, kw in COMMANDS.items()})
+
+
 def parcer(text: str):
-    for func, kw in COMMANDS.items():
-        command = text.rstrip().split()
-        if text.lower().startswith(kw) and command[0].lower() in kw:
-            return func, text[len(kw) :].strip().split()
+    keyword, args = split_command(text)
+    func = DISPATCH.get(keyword)
+    if func:
+        return func, args
     return unknown, []
 
 
-def addressbook_main():
+def conflict_message(names: list) -> str:
+    return (
+        f"Changed in another session at the same time, their version is kept: "
+        f"{', '.join(sorted(names))}"
+    )
+
+
+def load_saved_book() -> None:
     try:
-        if all([save_file.exists(), save_file.stat().st_size > 0]):
+        if phone_book.stored():
             print(phone_book.load_book())
     except:
         ...
 
+
+def addressbook_main():
+    load_saved_book()
+
     greeting()
     menu_completer = NestedCompleter.from_nested_dict(
         {
@@ -566,6 +1139,9 @@ def addressbook_main():
             "delete_record": {"name": None},
             "email": {"name email@": None},
             "find": {"anything": None},
+            "search": {"min 3 symbols": None},
+            "import": {"file.csv": None, "file.vcf": None},
+            "export": {"file.csv": None, "file.vcf": None},
             "hello": None,
             "help": None,
             "show_all": {"20"},
@@ -581,8 +1157,11 @@ def addressbook_main():
 
         func, data = parcer(user_input)
         result = func(*data)
+        conflicts = phone_book.commit()
         user_interface = UserInterface()
         user_interface.show_data(result)
+        if conflicts:
+            user_interface.show_data(conflict_message(conflicts))
         if result == "Phonebook saved. Good bye!":
             break
 
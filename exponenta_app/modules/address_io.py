@@ -0,0 +1,239 @@
+"""Bulk import and export of AddressBook contacts as CSV or vCard files.
+
+Files are read and written one row at a time. Rows are validated in
+batches with the precompiled patterns of address_book, and records are
+built directly, without the REPL handlers.
+"""
+import csv
+from datetime import date, datetime
+from itertools import islice
+from pathlib import Path
+import re
+
+from .address_book import COMPACT_EVERY, AddressBook, Adress, Email, Phone, Record
+from .validation import bad_emails, canonical_phones
+
+CSV_FIELDS = ["name", "phones", "birthday", "email", "adress"]
+BIRTHDAY_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%Y%m%d")
+BATCH_SIZE = 10000
+SHOW_ERRORS = 20
+
+VCARD_SPLIT = re.compile(r"(?<!\\);")
+VCARD_UNESCAPE = re.compile(r"\\(.)")
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    def __str__(self):
+        lines = [f"Imported {self.imported} contacts, {len(self.errors)} rows with errors"]
+        lines += [f"row {row}: {message}" for row, message in self.errors[:SHOW_ERRORS]]
+        if len(self.errors) > SHOW_ERRORS:
+            lines.append(f"... and {len(self.errors) - SHOW_ERRORS} more")
+        return "\n".join(lines)
+
+
+def parse_birthday(text: str) -> date:
+    # fast paths for dd/mm/YYYY and ISO dates, strptime for the rest
+    try:
+        if text.count("/") == 2:
+            day, month, year = text.split("/")
+            if len(year) == 4:
+                return date(int(year), int(month), int(day))
+        elif len(text) == 10:
+            return date.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"wrong birthday {text}")
+    for date_format in BIRTHDAY_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"wrong birthday {text}")
+
+
+def validate_batch(batch: list, book: AddressBook, result: ImportResult) -> list:
+    """Rows of the batch that can be added; errors of the others go to result."""
+    # phones and emails of the whole batch are validated as two columns
+    phones = [(i, phone) for i, (_, row) in enumerate(batch) for phone in row["phones"]]
+    canonical, bad = canonical_phones([phone for _, phone in phones])
+    bad_phone = {}
+    for position in bad:
+        i, phone = phones[position]
+        bad_phone.setdefault(i, phone)
+    row_phones = [[] for _ in batch]
+    for (i, _), phone in zip(phones, canonical):
+        row_phones[i].append(phone)
+    emails = [(i, row["email"]) for i, (_, row) in enumerate(batch) if row.get("email")]
+    bad_email = {emails[position][0] for position in bad_emails([email for _, email in emails])}
+
+    valid = []
+    names = set()
+    for i, (row_number, row) in enumerate(batch):
+        name = (row.get("name") or "").strip()
+        error = None
+        if not name:
+            error = "empty name"
+        elif name in book or name in names:
+            error = f"contact {name} already exists"
+        elif i in bad_phone:
+            error = f"wrong phone {bad_phone[i]}, it must contain 10 digits"
+        elif i in bad_email:
+            error = f"wrong email {row['email']}"
+        else:
+            try:
+                row["birthday"] = parse_birthday(row["birthday"]) if row.get("birthday") else None
+            except ValueError as e:
+                error = str(e)
+        if error:
+            result.errors.append((row_number, error))
+        else:
+            names.add(name)
+            row["name"] = name
+            row["phones"] = row_phones[i]
+            valid.append(row)
+    return valid
+
+
+def build_record(row: dict) -> Record:
+    """Record of a validated row, its phones and email are not checked again."""
+    rec = Record(row["name"], birthday_date=row["birthday"])
+    rec.phones = [Phone.restore(phone) for phone in row["phones"]]
+    if row.get("email"):
+        rec.email = Email.restore(row["email"])
+    if row.get("adress"):
+        rec.adress = Adress(row["adress"])
+    return rec
+
+
+def import_rows(book: AddressBook, rows) -> ImportResult:
+    """Add (row number, row) pairs to the book, BATCH_SIZE rows at a time."""
+    result = ImportResult()
+    rows = iter(rows)
+    while batch := list(islice(rows, BATCH_SIZE)):
+        for row in validate_batch(batch, book, result):
+            book.add_record(build_record(row))
+            result.imported += 1
+    if result.imported >= COMPACT_EVERY:
+        # one snapshot instead of a huge journal entry
+        book.compact()
+    return result
+
+
+def read_csv(file):
+    reader = csv.DictReader(file)
+    for row in reader:
+        phones = row.get("phones") or ""
+        row["phones"] = [p.strip() for p in phones.split(";") if p.strip()]
+        yield reader.line_num, row
+
+
+def write_csv(book: AddressBook, file) -> int:
+    writer = csv.writer(file)
+    writer.writerow(CSV_FIELDS)
+    count = 0
+    for rec in book.values():
+        writer.writerow([
+            rec.name.value,
+            ";".join(p.phone for p in rec.phones),
+            rec.birthday.strftime("%d/%m/%Y") if rec.birthday else "",
+            rec.email or "",
+            rec.adress or "",
+        ])
+        count += 1
+    return count
+
+
+def vcard_escape(value) -> str:
+    return (
+        str(value).replace("\\", "\\\\").replace(",", "\\,")
+        .replace(";", "\\;").replace("\n", "\\n")
+    )
+
+
+def vcard_unescape(value: str) -> str:
+    return VCARD_UNESCAPE.sub(lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def unfold(file):
+    """Logical vCard lines: a line starting with a space or tab continues the previous one."""
+    line = None
+    for raw in file:
+        raw = raw.rstrip("\r\n")
+        if raw[:1] in (" ", "\t") and line is not None:
+            line += raw[1:]
+            continue
+        if line is not None:
+            yield line
+        line = raw
+    if line is not None:
+        yield line
+
+
+def read_vcard(file):
+    card = None
+    for line_number, line in enumerate(unfold(file), 1):
+        key, _, value = line.partition(":")
+        key = key.split(";")[0].upper()
+        if key == "BEGIN":
+            card = {"phones": [], "line": line_number}
+        elif card is None:
+            continue
+        elif key == "END":
+            yield card.pop("line"), card
+            card = None
+        elif key == "FN":
+            card["name"] = vcard_unescape(value)
+        elif key == "TEL":
+            card["phones"].append(vcard_unescape(value).strip())
+        elif key == "EMAIL":
+            card["email"] = vcard_unescape(value).strip()
+        elif key == "BDAY":
+            card["birthday"] = value.strip()
+        elif key == "ADR":
+            parts = [vcard_unescape(p) for p in VCARD_SPLIT.split(value)]
+            card["adress"] = ", ".join(p for p in parts if p)
+
+
+def write_vcard(book: AddressBook, file) -> int:
+    count = 0
+    for rec in book.values():
+        lines = ["BEGIN:VCARD", "VERSION:3.0", f"FN:{vcard_escape(rec.name)}"]
+        lines += [f"TEL:{p.phone}" for p in rec.phones]
+        if rec.email:
+            lines.append(f"EMAIL:{vcard_escape(rec.email)}")
+        if rec.birthday:
+            lines.append(f"BDAY:{rec.birthday.isoformat()}")
+        if rec.adress:
+            lines.append(f"ADR:;;{vcard_escape(rec.adress)};;;;")
+        lines.append("END:VCARD")
+        file.write("\r\n".join(lines) + "\r\n")
+        count += 1
+    return count
+
+
+FORMATS = {
+    ".csv": (read_csv, write_csv),
+    ".vcf": (read_vcard, write_vcard),
+}
+
+
+def file_format(path: Path) -> tuple:
+    try:
+        return FORMATS[path.suffix.lower()]
+    except KeyError:
+        raise ValueError(f"unknown file type {path.suffix}, use .csv or .vcf")
+
+
+def import_file(book: AddressBook, path: Path) -> ImportResult:
+    reader, _ = file_format(path)
+    with open(path, newline="", encoding="utf-8") as file:
+        return import_rows(book, reader(file))
+
+
+def export_file(book: AddressBook, path: Path) -> int:
+    _, writer = file_format(path)
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        return writer(book, file)
@@ -0,0 +1,318 @@
+"""AddressBook kept in an SQLite database instead of memory.
+
+Used when EXPONENTA_STORAGE=sqlite. Records are read from the database
+when they are used and written back when they change, so memory use does
+not grow with the book and nothing has to be loaded on start. Changes
+between two commits form one transaction. A record changed by another
+session since it was read is not written and is reported by commit().
+Searches go through an FTS5 trigram index of names, adresses and phones;
+if the sqlite3 build has no trigram tokenizer they scan the tables.
+"""
+from collections.abc import MutableMapping
+from datetime import date
+from pathlib import Path
+import sqlite3
+
+from .address_book import PAGE_SIZE, AddressBook, Pager, Record, upcoming_days
+from .validation import PHONE_SEPARATORS
+
+db_file = Path("phone_book.db")
+BUSY_TIMEOUT = 30
+
+# birthday_key is month * 100 + day: ordered like the day of the year,
+# with Feb 29 in its own place for every year
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    name TEXT PRIMARY KEY,
+    birthday TEXT,
+    birthday_key INTEGER,
+    email TEXT,
+    adress TEXT,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contacts_birthday ON contacts (birthday_key);
+CREATE TABLE IF NOT EXISTS phones (
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    phone TEXT NOT NULL,
+    PRIMARY KEY (name, position)
+);
+CREATE INDEX IF NOT EXISTS phones_phone ON phones (phone, name);
+"""
+
+# rowid is the rowid of the contact, phones are its phones joined by spaces
+SEARCH_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_search "
+    "USING fts5(name, adress, phones, tokenize='trigram')"
+)
+FILL_SEARCH = """
+INSERT INTO contacts_search (rowid, name, adress, phones)
+SELECT contacts.rowid, contacts.name, coalesce(adress, ''), coalesce(group_concat(phone, ' '), '')
+FROM contacts LEFT JOIN phones ON phones.name = contacts.name
+GROUP BY contacts.name
+"""
+
+CONTACT_COLUMNS = "name, birthday, email, adress, version"
+
+
+def match_phrase(text: str) -> str:
+    return '"{}"'.format(text.replace('"', '""'))
+
+
+class SqliteAddressBook(MutableMapping):
+    def __init__(self, path: Path = db_file):
+        self.path = path
+        self.connection = None
+        self.conflicts = []
+        self.trigram = False
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """Connection to the database, opened on first use."""
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+            self.connection.create_function("lower_text", 1, str.lower, deterministic=True)
+            self.create_search()
+        return self.connection
+
+    def create_search(self) -> None:
+        db = self.connection
+        exists = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'contacts_search'").fetchone()
+        try:
+            db.execute(SEARCH_SCHEMA)
+        except sqlite3.OperationalError:
+            # sqlite3 older than 3.34 has no trigram tokenizer
+            return
+        self.trigram = True
+        if not exists:
+            # books made before the search index
+            with db:
+                db.execute(FILL_SEARCH)
+
+    def index_record(self, rowid: int, rec: Record = None) -> None:
+        """Put rec in the search index in place of the contact with rowid; without rec only remove it."""
+        if not self.trigram:
+            return
+        self.db.execute("DELETE FROM contacts_search WHERE rowid = ?", (rowid,))
+        if rec is not None:
+            self.db.execute(
+                "INSERT INTO contacts_search (rowid, name, adress, phones) VALUES (?, ?, ?, ?)",
+                (
+                    rowid,
+                    rec.name.value,
+                    rec.adress.value if rec.adress else "",
+                    " ".join(p.phone for p in rec.phones),
+                ),
+            )
+
+    def record(self, row: tuple, phones: list) -> Record:
+        name, birthday, email, adress, version = row
+        birthday = date.fromisoformat(birthday) if birthday else None
+        rec = Record.__new__(Record)
+        rec.__setstate__((name, phones, birthday, email, adress, version))
+        rec.book = self
+        return rec
+
+    @staticmethod
+    def columns(rec: Record) -> tuple:
+        birthday = rec.birthday
+        return (
+            birthday.strftime("%Y-%m-%d") if birthday else None,
+            birthday.month * 100 + birthday.day if birthday else None,
+            rec.email.email if rec.email else None,
+            rec.adress.value if rec.adress else None,
+        )
+
+    def __getitem__(self, name: str) -> Record:
+        row = self.db.execute(
+            f"SELECT {CONTACT_COLUMNS} FROM contacts WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(name)
+        phones = self.db.execute(
+            "SELECT phone FROM phones WHERE name = ? ORDER BY position", (name,)
+        )
+        return self.record(row, [phone for phone, in phones])
+
+    def __setitem__(self, name: str, rec: Record):
+        row = self.db.execute("SELECT version FROM contacts WHERE name = ?", (name,)).fetchone()
+        rec.book = self
+        if row is None:
+            self.insert(rec)
+        else:
+            # replaces the stored record whatever its version is
+            rec.version = row[0]
+            self.record_changed(rec)
+
+    def __delitem__(self, name: str):
+        row = self.db.execute("SELECT rowid FROM contacts WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        self.index_record(row[0])
+        self.db.execute("DELETE FROM contacts WHERE name = ?", (name,))
+        self.db.execute("DELETE FROM phones WHERE name = ?", (name,))
+
+    def __contains__(self, name) -> bool:
+        return self.db.execute("SELECT 1 FROM contacts WHERE name = ?", (name,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT count(*) FROM contacts").fetchone()[0]
+
+    def __iter__(self):
+        for name, in self.db.execute("SELECT name FROM contacts ORDER BY name"):
+            yield name
+
+    def values(self):
+        """All records in name order, read as they are used."""
+        phones = self.db.execute("SELECT name, phone FROM phones ORDER BY name, position")
+        pending = next(phones, None)
+        for row in self.db.execute(f"SELECT {CONTACT_COLUMNS} FROM contacts ORDER BY name"):
+            numbers = []
+            while pending is not None and pending[0] == row[0]:
+                numbers.append(pending[1])
+                pending = next(phones, None)
+            yield self.record(row, numbers)
+
+    def insert(self, rec: Record) -> None:
+        rec.version = 1
+        rowid = self.db.execute(
+            "INSERT INTO contacts (name, birthday, birthday_key, email, adress, version) "
+            "VALUES (?, ?, ?, ?, ?, 1)",
+            (rec.name.value, *self.columns(rec)),
+        ).lastrowid
+        self.write_phones(rec)
+        self.index_record(rowid, rec)
+
+    def write_phones(self, rec: Record) -> None:
+        name = rec.name.value
+        self.db.execute("DELETE FROM phones WHERE name = ?", (name,))
+        self.db.executemany(
+            "INSERT INTO phones (name, position, phone) VALUES (?, ?, ?)",
+            [(name, position, p.phone) for position, p in enumerate(rec.phones)],
+        )
+
+    def record_changed(self, rec: Record) -> None:
+        cursor = self.db.execute(
+            "UPDATE contacts SET birthday = ?, birthday_key = ?, email = ?, adress = ?, "
+            "version = version + 1 WHERE name = ? AND version = ?",
+            (*self.columns(rec), rec.name.value, rec.version),
+        )
+        if not cursor.rowcount:
+            # changed or deleted in another session since it was read
+            self.conflicts.append(rec.name.value)
+            return
+        rec.version += 1
+        self.write_phones(rec)
+        rowid = self.db.execute(
+            "SELECT rowid FROM contacts WHERE name = ?", (rec.name.value,)
+        ).fetchone()[0]
+        self.index_record(rowid, rec)
+
+    def add_record(self, rec: Record):
+        if rec.name.value in self:
+            raise ValueError
+        rec.book = self
+        self.insert(rec)
+
+    def find(self, name: str) -> Record:
+        return self.get(name)
+
+    def delete(self, name: str):
+        if name in self:
+            return self.pop(name)
+
+    def upcoming_birthdays(self, num_days: int, today: date = None) -> list:
+        keys = {
+            month * 100 + day: offset
+            for (month, day), offset in upcoming_days(num_days, today).items()
+        }
+        rows = self.db.execute(
+            f"SELECT name, birthday_key FROM contacts WHERE birthday_key IN ({','.join('?' * len(keys))})",
+            list(keys),
+        )
+        return [(days, self[name]) for days, name in sorted((keys[key], name) for name, key in rows)]
+
+    def search(self, search: str, phones: bool = True, text: bool = True):
+        # phones are stored as digits, as in AddressBook.search
+        digits = search.translate(PHONE_SEPARATORS)
+        if self.trigram and len(search) >= 3 and (not phones or len(digits) >= 3):
+            terms = []
+            if text:
+                terms.append("{name adress} : " + match_phrase(search))
+            if phones:
+                terms.append("phones : " + match_phrase(digits))
+            if not terms:
+                return []
+            rows = self.db.execute(
+                "SELECT name FROM contacts_search WHERE contacts_search MATCH ? ORDER BY name",
+                (" OR ".join(terms),),
+            ).fetchall()
+            return [self[name] for name, in rows]
+        # the trigram index needs 3 characters
+        queries, params = [], []
+        if text:
+            queries.append(
+                "SELECT name FROM contacts WHERE instr(lower_text(name), ?) "
+                "OR instr(lower_text(coalesce(adress, '')), ?)"
+            )
+            params += [search.lower()] * 2
+        if phones:
+            queries.append("SELECT name FROM phones WHERE instr(phone, ?)")
+            params.append(digits)
+        if not queries:
+            return []
+        rows = self.db.execute(" UNION ".join(queries) + " ORDER BY name", params).fetchall()
+        return [self[name] for name, in rows]
+
+    def names_from(self, start: str, count: int) -> list:
+        rows = self.db.execute(
+            "SELECT name FROM contacts WHERE name >= ? ORDER BY name LIMIT ?", (start, count)
+        )
+        return [name for name, in rows]
+
+    def name_at(self, position: int):
+        row = self.db.execute(
+            "SELECT name FROM contacts ORDER BY name LIMIT 1 OFFSET ?", (position,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def position_of(self, name: str) -> int:
+        return self.db.execute("SELECT count(*) FROM contacts WHERE name < ?", (name,)).fetchone()[0]
+
+    def iterator(self, quantity=None):
+        return iter(Pager(self, quantity or PAGE_SIZE))
+
+    def commit(self) -> list:
+        """Commit the changes; returns the names of the records that were not written."""
+        if self.connection is not None:
+            self.connection.commit()
+        conflicts, self.conflicts = self.conflicts, []
+        return conflicts
+
+    def compact(self) -> None:
+        self.commit()
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def migrate_book(self) -> str:
+        """Copy the book saved in pickle files into the database."""
+        book = AddressBook()
+        book.load_book()
+        for rec in book.values():
+            self[rec.name.value] = rec
+        self.compact()
+        return f"Phonebook migrated to {self.path}, {len(book)} records"
+
+    def save_book(self) -> str:
+        self.commit()
+        return f"Phonebook saved. Good bye!"
+
+    def stored(self) -> bool:
+        return self.path.exists() or AddressBook.stored()
+
+    def load_book(self) -> str:
+        if not self.path.exists() and AddressBook.stored():
+            return self.migrate_book()
+        self.db  # creates the database on the first start
+        return f"Phonebook loaded"
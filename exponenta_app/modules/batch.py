@@ -0,0 +1,93 @@
+"""Run address book or notebook commands from a file or stdin.
+
+Lines go through the same parsers and handlers as the interactive loops,
+without prompt_toolkit. Empty lines and lines starting with '#' are skipped.
+
+Run: python -m exponenta_app.modules.batch {addressbook,notebook} [FILE] [--commit-every N] [--quiet]
+"""
+import argparse
+from contextlib import redirect_stdout
+import os
+import sys
+from time import perf_counter
+
+from . import address_book, note
+
+STOP_WORDS = ("exit", "close", "quit", "good_bye", "stop")
+
+
+def script_lines(lines):
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def run_addressbook(lines, commit_every: int = None) -> int:
+    """Run address book commands until the end of lines or an exit command;
+    changes are committed every commit_every commands and at the end."""
+    # the script is not there to answer show_all's prompts
+    address_book.interactive = False
+    address_book.load_saved_book()
+    count = 0
+    for line in script_lines(lines):
+        if line.lower().startswith(STOP_WORDS):
+            break
+        func, data = address_book.parcer(line)
+        result = func(*data)
+        if result is not None:
+            print(result)
+        count += 1
+        if commit_every and count % commit_every == 0:
+            commit_addressbook()
+    commit_addressbook()
+    return count
+
+
+def commit_addressbook() -> None:
+    conflicts = address_book.phone_book.commit()
+    if conflicts:
+        print(address_book.conflict_message(conflicts))
+
+
+def run_notebook(lines, commit_every: int = None) -> int:
+    """Run notebook commands until the end of lines or an exit command."""
+    notebook = note.get_notebook()
+    count = 0
+    for line in script_lines(lines):
+        if line.lower().startswith(STOP_WORDS):
+            break
+        note.parser(line)
+        count += 1
+        if commit_every and count % commit_every == 0:
+            notebook.save_notes()
+    notebook.save_notes()
+    return count
+
+
+RUNNERS = {"addressbook": run_addressbook, "notebook": run_notebook}
+
+
+def batch_main(argv: list = None) -> None:
+    args_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args_parser.add_argument("module", choices=RUNNERS)
+    args_parser.add_argument("file", nargs="?", help="command file, stdin if omitted")
+    args_parser.add_argument("--commit-every", type=int, metavar="N")
+    args_parser.add_argument("--quiet", action="store_true", help="hide command output")
+    args = args_parser.parse_args(argv)
+
+    source = open(args.file) if args.file else sys.stdin
+    start = perf_counter()
+    with source, open(os.devnull, "w") as devnull:
+        output = devnull if args.quiet else sys.stdout
+        with redirect_stdout(output):
+            count = RUNNERS[args.module](source, args.commit_every)
+    seconds = perf_counter() - start
+    print(
+        f"{count} commands in {seconds:.2f} s, {count / seconds if seconds else 0:,.0f} commands/s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    batch_main()
@@ -0,0 +1,17 @@
+def split_command(text: str) -> tuple:
+    """Split an input line into a lowercased command word and its arguments."""
+    words = text.strip().split()
+    if not words:
+        return "", []
+    return words[0].lower(), words[1:]
+
+
+def build_dispatch(commands: dict) -> dict:
+    """{command word: handler} from {handler: word or tuple of alias words}."""
+    dispatch = {}
+    for func, keywords in commands.items():
+        if isinstance(keywords, str):
+            keywords = (keywords,)
+        for keyword in keywords:
+            dispatch[keyword.lower()] = func
+    return dispatch
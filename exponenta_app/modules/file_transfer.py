@@ -0,0 +1,166 @@
+"""Moving files between folders that may be on different filesystems.
+
+A move on one filesystem is a rename. Across filesystems, told apart by
+the device of the folders, the file is
+copied to a temporary name next to the target with copy_file_range or
+sendfile, so the bytes stay in the kernel, then checked against the
+source, flushed to disk, renamed into place, and only then is the source
+removed.
+"""
+import errno
+import hashlib
+import os
+from pathlib import Path
+import shutil
+
+CHUNK_SIZE = 1 << 20
+# most bytes one copy_file_range or sendfile call moves on Linux
+MAX_CHUNK = 0x7FFFF000
+
+
+class TransferError(OSError):
+    ...
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fsync_folder(folder: Path) -> None:
+    """Flush the names in folder to disk."""
+    if os.name == "nt":
+        # folders can't be opened on Windows, renames there are journaled
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def copy_range(source: int, target: int, size: int) -> int:
+    copied = 0
+    while copied < size:
+        sent = os.copy_file_range(source, target, min(size - copied, MAX_CHUNK))
+        if not sent:
+            break
+        copied += sent
+    return copied
+
+
+def send_file(source: int, target: int, size: int) -> int:
+    copied = 0
+    while copied < size:
+        sent = os.sendfile(target, source, copied, min(size - copied, MAX_CHUNK))
+        if not sent:
+            break
+        copied += sent
+    return copied
+
+
+def read_write(source: int, target: int, size: int) -> int:
+    copied = 0
+    while chunk := os.read(source, CHUNK_SIZE):
+        os.write(target, chunk)
+        copied += len(chunk)
+    return copied
+
+
+class Transfer:
+    """Moves files by rename, or by a copy when the target is on another filesystem.
+
+    The device of every folder is looked up once. verify is "size" or
+    "hash": what of a copy is compared with the source before the source
+    is removed. Copiers that fail with ENOSYS, EXDEV and the like are not
+    tried again.
+    """
+
+    def __init__(self, verify: str = "size"):
+        if verify not in ("size", "hash"):
+            raise ValueError(f"Unknown verify mode {verify}")
+        self.verify = verify
+        self.devices = {}
+        self.copiers = [
+            copier
+            for copier, name in ((copy_range, "copy_file_range"), (send_file, "sendfile"))
+            if hasattr(os, name)
+        ]
+
+    def device(self, path: Path) -> int:
+        """Device of the folder of path."""
+        folder = os.path.dirname(path)
+        device = self.devices.get(folder)
+        if device is None:
+            device = self.devices[folder] = os.stat(folder or ".").st_dev
+        return device
+
+    def move(self, source: Path, target: Path) -> bool:
+        """Move source to target; returns True if it was copied."""
+        if self.device(source) == self.device(target):
+            try:
+                os.replace(source, target)
+                return False
+            except OSError as e:
+                # bind mounts of one device
+                if e.errno != errno.EXDEV:
+                    raise
+        if source.is_symlink():
+            self.copy_link(source, target)
+        else:
+            self.copy_file(source, target)
+        os.unlink(source)
+        return True
+
+    def copy_link(self, source: Path, target: Path) -> None:
+        # replaces the target like a rename does
+        temporary = target.with_name(f".{target.name}.part")
+        temporary.unlink(missing_ok=True)
+        os.symlink(os.readlink(source), temporary)
+        try:
+            os.replace(temporary, target)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+        fsync_folder(target.parent)
+
+    def copy_file(self, source: Path, target: Path) -> None:
+        temporary = target.with_name(f".{target.name}.part")
+        try:
+            with open(source, "rb") as src, open(temporary, "wb") as dst:
+                size = os.fstat(src.fileno()).st_size
+                copied = self.copy_data(src.fileno(), dst.fileno(), size)
+                if copied != size or os.fstat(dst.fileno()).st_size != size:
+                    raise TransferError(f"{source} copied {copied} of {size} bytes")
+                os.fsync(dst.fileno())
+            shutil.copystat(source, temporary)
+            if self.verify == "hash" and hash_file(source) != hash_file(temporary):
+                raise TransferError(f"Copy of {source} differs from it")
+            os.replace(temporary, target)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+        # the new name has to be on disk before the source is removed
+        fsync_folder(target.parent)
+
+    def copy_data(self, source: int, target: int, size: int) -> int:
+        for copier in self.copiers:
+            try:
+                return copier(source, target, size)
+            except OSError as e:
+                if e.errno not in (
+                    errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.ENOTSUP, errno.EBADF, errno.ENOTSOCK,
+                ):
+                    raise
+                # not supported between these files, start over with the next copier
+                self.copiers = [c for c in self.copiers if c is not copier]
+                os.lseek(source, 0, os.SEEK_SET)
+                os.lseek(target, 0, os.SEEK_SET)
+                os.ftruncate(target, 0)
+        return read_write(source, target, size)
+
+
+DEFAULT_TRANSFER = Transfer()
@@ -0,0 +1,42 @@
+"""Advisory file locks shared by the sessions working in one directory.
+
+A lock file next to the data is locked, not the data files themselves:
+those are replaced or removed on compaction while other sessions wait.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Hold an exclusive lock on path while the block runs; waits for other holders."""
+    with open(path, "a+b") as file:
+        if fcntl:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def file_stamp(path: Path):
+    """What changes when path is rewritten or replaced; None if it does not exist."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
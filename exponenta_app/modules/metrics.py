@@ -0,0 +1,186 @@
+"""Opt-in latency and error metrics of the commands and storage calls.
+
+Set EXPONENTA_METRICS to a file name to record them. They are written
+there on exit, as Prometheus text if the name ends with .prom and as
+JSON otherwise. The stats command shows them at any time. When the
+variable is not set, every hook here returns at once.
+"""
+import atexit
+from collections import defaultdict
+from functools import wraps
+import json
+import os
+from pathlib import Path
+from time import perf_counter
+
+# upper bounds of the latency buckets, in seconds
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def cumulative(self) -> list:
+        """(upper bound, observations not above it) pairs, ending with +Inf."""
+        result, total = [], 0
+        for bound, count in zip([*map(str, BUCKETS), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    def __init__(self):
+        self.commands = defaultdict(Histogram)
+        self.storage = defaultdict(Histogram)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.command = None
+
+    def as_dict(self) -> dict:
+        def histograms(table):
+            return {
+                name: {
+                    "count": h.count,
+                    "sum": h.sum,
+                    "max": h.max,
+                    "buckets": dict(h.cumulative()),
+                }
+                for name, h in sorted(table.items())
+            }
+
+        return {
+            "commands": histograms(self.commands),
+            "storage": histograms(self.storage),
+            "errors": [
+                {"command": command, "exception": exception, "count": count}
+                for (command, exception), count in sorted(self.errors.items())
+            ],
+            "bytes": [
+                {"store": store, "direction": direction, "bytes": size}
+                for (store, direction), size in sorted(self.bytes.items())
+            ],
+        }
+
+    def as_prometheus(self) -> str:
+        lines = []
+        for metric, label, table, text in (
+            ("exponenta_command_seconds", "command", self.commands, "Latency of the commands."),
+            ("exponenta_storage_seconds", "call", self.storage, "Latency of the storage calls."),
+        ):
+            lines += [f"# HELP {metric} {text}", f"# TYPE {metric} histogram"]
+            for name, h in sorted(table.items()):
+                for bound, count in h.cumulative():
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_sum{{{label}="{name}"}} {h.sum}')
+                lines.append(f'{metric}_count{{{label}="{name}"}} {h.count}')
+        lines += [
+            "# HELP exponenta_command_errors_total Errors of the commands by exception type.",
+            "# TYPE exponenta_command_errors_total counter",
+        ]
+        for (command, exception), count in sorted(self.errors.items()):
+            lines.append(f'exponenta_command_errors_total{{command="{command}",exception="{exception}"}} {count}')
+        lines += [
+            "# HELP exponenta_storage_bytes_total Bytes read and written by the stores.",
+            "# TYPE exponenta_storage_bytes_total counter",
+        ]
+        for (store, direction), size in sorted(self.bytes.items()):
+            lines.append(f'exponenta_storage_bytes_total{{store="{store}",direction="{direction}"}} {size}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: Path) -> None:
+        if path.suffix == ".prom":
+            path.write_text(self.as_prometheus())
+        else:
+            path.write_text(json.dumps(self.as_dict(), indent=2))
+
+
+registry = None
+
+
+def enable(path: Path = None) -> Metrics:
+    """Start recording; with a path the metrics are written there on exit."""
+    global registry
+    registry = Metrics()
+    if path:
+        path = path.resolve()
+        atexit.register(lambda: registry.dump(path))
+    return registry
+
+
+def timed_command(name: str, func):
+    """func recording its latency under name, and its uncaught errors."""
+    if isinstance(name, tuple):
+        name = name[0]
+
+    @wraps(func)
+    def inner(*args):
+        if registry is None:
+            return func(*args)
+        registry.command = name
+        start = perf_counter()
+        try:
+            return func(*args)
+        except Exception as e:
+            registry.errors[(name, type(e).__name__)] += 1
+            raise
+        finally:
+            registry.commands[name].observe(perf_counter() - start)
+            registry.command = None
+
+    return inner
+
+
+def timed_storage(name: str):
+    """Decorator recording the latency of a storage call."""
+
+    def decorator(func):
+        @wraps(func)
+        def inner(*args, **kwargs):
+            if registry is None:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.storage[name].observe(perf_counter() - start)
+
+        return inner
+
+    return decorator
+
+
+def error(e: Exception) -> None:
+    """Count an error a handler turned into a message."""
+    if registry is not None:
+        registry.errors[(registry.command or "unknown", type(e).__name__)] += 1
+
+
+def add_bytes(store: str, direction: str, size: int) -> None:
+    if registry is not None:
+        registry.bytes[(store, direction)] += size
+
+
+def report(text_format: str = "json") -> str:
+    if registry is None:
+        return "Metrics are off. Set EXPONENTA_METRICS=<file> to record them"
+    if text_format == "prometheus":
+        return registry.as_prometheus()
+    return json.dumps(registry.as_dict(), indent=2)
+
+
+if os.environ.get("EXPONENTA_METRICS"):
+    enable(Path(os.environ["EXPONENTA_METRICS"]))
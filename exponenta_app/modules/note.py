@@ -1,10 +1,21 @@
-from collections import UserList
+from collections import UserDict, defaultdict
+from math import log
+import mmap
+import os
 from pathlib import Path
 import pickle
+import re
+import struct
 
+from . import metrics
+from .commands import split_command
+from .locking import file_lock, file_stamp
 
 
 save_file = Path("notes.bin")
+index_file = Path("notes.idx")
+
+CONFLICT_MESSAGE = "Note {} was changed in another session, check it with show and try again"
 
 
 class Notes:
@@ -14,99 +25,495 @@ class Notes:
         self.tag = tag
 
 
-class NoteBook(UserList):
+class NoteIndex:
+    """Inverted index: tag -> note ids and word -> {note id: count}."""
+
+    def __init__(self):
+        self.tags = defaultdict(set)
+        self.words = defaultdict(dict)
+
+    @staticmethod
+    def tokenize(text: str) -> list:
+        return re.findall(r"\w+", text.lower())
+
+    def add(self, note: dict) -> None:
+        note_id = note["id"]
+        for tag in note["tags"]:
+            self.tags[tag.lower()].add(note_id)
+        for word in self.tokenize(note["text"]):
+            postings = self.words[word]
+            postings[note_id] = postings.get(note_id, 0) + 1
+
+    def remove(self, note: dict) -> None:
+        note_id = note["id"]
+        for tag in note["tags"]:
+            ids = self.tags.get(tag.lower())
+            if ids is not None:
+                ids.discard(note_id)
+                if not ids:
+                    del self.tags[tag.lower()]
+        for word in set(self.tokenize(note["text"])):
+            postings = self.words.get(word)
+            if postings is not None:
+                postings.pop(note_id, None)
+                if not postings:
+                    del self.words[word]
+
+    def clear(self) -> None:
+        self.tags.clear()
+        self.words.clear()
+
+    def search_tags(self, tags: list, match_all: bool = True) -> set:
+        postings = [self.tags.get(tag.lower().lstrip("#"), set()) for tag in tags]
+        if not postings:
+            return set()
+        if match_all:
+            postings.sort(key=len)
+            return set(postings[0]).intersection(*postings[1:])
+        return set().union(*postings)
+
+    def search_words(self, text: str, total: int) -> list:
+        """Ids of notes with any of the words, best tf-idf score first."""
+        scores = defaultdict(float)
+        for word in set(self.tokenize(text)):
+            postings = self.words.get(word)
+            if not postings:
+                continue
+            idf = log(1 + total / len(postings))
+            for note_id, count in postings.items():
+                scores[note_id] += count * idf
+        return sorted(scores, key=lambda note_id: (-scores[note_id], note_id))
+
+
+class NoteStore:
+    """Notes on disk as an append-only body segment and an offset index.
+
+    Pickled note bodies are appended to the body file, and an (id, offset,
+    length) entry is appended to the index file after each of them; an
+    entry with zero length deletes the note. Only the index is read on
+    open, bodies are read from a memory map when needed. The index header
+    holds the generation of the body file, so compaction is committed by
+    replacing the index alone. next_id is one past the highest id any entry
+    has, deleted ones too; compaction keeps a deletion entry for it so ids
+    are never given out twice.
+    """
+
+    header = struct.Struct("<8sQ")
+    entry = struct.Struct("<qQI")
+    magic = b"EXPNOTES"
+
+    def __init__(self, index_path: Path = index_file):
+        self.index_path = index_path
+        self.generation = 0
+        self.map = None
+        self.size = 0
+        # how much of which index file was read, to pick up other sessions' entries
+        self.index_stamp = None
+        self.index_offset = 0
+        self.next_id = 0
+
+    @property
+    def lock_path(self) -> Path:
+        return self.index_path.with_suffix(".lock")
+
+    def locked(self):
+        return file_lock(self.lock_path)
+
+    @property
+    def body_path(self) -> Path:
+        return self.index_path.with_name(f"{self.index_path.stem}.{self.generation}.dat")
+
+    def exists(self) -> bool:
+        return self.index_path.exists()
+
+    def open(self) -> dict:
+        """Read the index, returning {id: (offset, length)} of the live notes; call with the lock held."""
+        self.close()
+        if not self.index_path.exists():
+            self.write_header(self.index_path)
+        data = self.index_path.read_bytes()
+        metrics.add_bytes("notes", "read", len(data))
+        magic, self.generation = self.header.unpack_from(data)
+        if magic != self.magic:
+            raise ValueError(f"{self.index_path} is not a notes index")
+        torn = (len(data) - self.header.size) % self.entry.size
+        if torn:
+            # a torn entry would shift every entry appended after it
+            with open(self.index_path, "r+b") as file:
+                file.truncate(len(data) - torn)
+        self.index_offset = self.header.size
+        self.index_stamp = file_stamp(self.index_path)
+        self.next_id = 0
+        entries = self.read_entries(data[: len(data) - torn])
+        return {note_id: location for note_id, location in entries.items() if location}
+
+    def read_entries(self, data: bytes) -> dict:
+        """{id: (offset, length) or None for deleted} of the index entries in data[self.index_offset:]."""
+        self.size = self.body_path.stat().st_size if self.body_path.exists() else 0
+        locations = {}
+        for note_id, offset, length in self.entry.iter_unpack(data[self.index_offset :]):
+            self.next_id = max(self.next_id, note_id + 1)
+            if not length:
+                locations[note_id] = None
+            elif offset + length <= self.size:
+                # entries past the end of the bodies are left by an interrupted write
+                locations[note_id] = (offset, length)
+        self.index_offset = len(data)
+        return locations
+
+    def changes(self):
+        """Entries other sessions appended since the last read, as read_entries returns them;
+        None when the index was replaced by a compaction and has to be opened again.
+        Call with the lock held."""
+        if file_stamp(self.index_path) == self.index_stamp:
+            return {}
+        with open(self.index_path, "rb") as file:
+            data = file.read()
+        metrics.add_bytes("notes", "read", len(data))
+        magic, generation = self.header.unpack_from(data)
+        if generation != self.generation:
+            return None
+        changes = self.read_entries(data)
+        self.index_stamp = file_stamp(self.index_path)
+        return changes
+
+    def write_header(self, path: Path) -> None:
+        with open(path, "wb") as file:
+            file.write(self.header.pack(self.magic, self.generation))
+
+    def body(self, offset: int, length: int) -> bytes:
+        if self.map is None or offset + length > len(self.map):
+            self.close()
+            with open(self.body_path, "rb") as file:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        metrics.add_bytes("notes", "read", length)
+        return self.map[offset : offset + length]
+
+    def read(self, offset: int, length: int) -> dict:
+        return pickle.loads(self.body(offset, length))
+
+    def append(self, note: dict) -> tuple:
+        body = pickle.dumps(note)
+        metrics.add_bytes("notes", "written", len(body))
+        with open(self.body_path, "ab") as file:
+            offset = file.seek(0, os.SEEK_END)
+            file.write(body)
+        self.size = offset + len(body)
+        self.write_entry(note["id"], offset, len(body))
+        return offset, len(body)
+
+    def delete(self, note_id: int) -> None:
+        self.write_entry(note_id, 0, 0)
+
+    def write_entry(self, note_id: int, offset: int, length: int) -> None:
+        metrics.add_bytes("notes", "written", self.entry.size)
+        with open(self.index_path, "ab") as file:
+            file.write(self.entry.pack(note_id, offset, length))
+            self.index_offset = file.tell()
+        self.next_id = max(self.next_id, note_id + 1)
+        self.index_stamp = file_stamp(self.index_path)
+
+    @metrics.timed_storage("notes.compact")
+    def compact(self, locations: dict) -> dict:
+        """Rewrite the live notes into a new body file; returns their new locations."""
+        old_body = self.body_path
+        if locations:
+            # map the whole current body before switching to the new file
+            self.body(0, self.size)
+        self.generation += 1
+        new_locations = {}
+        index_tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        self.write_header(index_tmp)
+        with open(self.body_path, "wb") as body, open(index_tmp, "ab") as index:
+            for note_id, (offset, length) in locations.items():
+                new_locations[note_id] = (body.tell(), length)
+                index.write(self.entry.pack(note_id, body.tell(), length))
+                body.write(self.body(offset, length))
+            if self.next_id - 1 not in locations and self.next_id:
+                # the highest id was deleted, keep it taken
+                index.write(self.entry.pack(self.next_id - 1, 0, 0))
+        self.close()
+        os.replace(index_tmp, self.index_path)
+        old_body.unlink(missing_ok=True)
+        self.size = self.body_path.stat().st_size
+        self.index_offset = self.index_path.stat().st_size
+        metrics.add_bytes("notes", "written", self.size + self.index_offset)
+        self.index_stamp = file_stamp(self.index_path)
+        return new_locations
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class NoteBook(UserDict):
+    """Notes keyed by stable ids, in insertion order.
+
+    self.data keeps only where every note is stored, note bodies are read
+    from the NoteStore on access. The search index is built on first use.
+    """
+
     def __init__(self):
         super().__init__()
+        self.store = NoteStore()
+        self.index = NoteIndex()
+        self.indexed = False
+        self.sort_by_tags = False
+        self.sorted_ids = None
+        # versions of the notes as this session last showed or wrote them
+        self.seen = {}
         self.load_notes()
 
+    def __getitem__(self, note_id: int) -> dict:
+        return self.store.read(*self.data[note_id])
+
+    @metrics.timed_storage("notes.load")
     def load_notes(self):
         try:
-            with open(save_file, "rb") as file:
-                self.data = pickle.load(file)
-                print("Notebook succefully load")
-        except FileNotFoundError:
-            print("Notes file not found. A new notepad has been created.")
+            with self.store.locked():
+                if not self.store.exists() and save_file.exists():
+                    # notebook pickled by an earlier version
+                    with open(save_file, "rb") as file:
+                        notes = self.migrate(pickle.load(file))
+                    self.store.open()
+                    for note in notes.values():
+                        self.store.append(note)
+                if self.store.exists():
+                    self.data = self.store.open()
+                    print("Notebook succefully load")
+                else:
+                    self.store.open()
+                    print("Notes file not found. A new notepad has been created.")
         except Exception as e:
             print(f"Error loading notes: {e}")
-
+        self.index.clear()
+        self.indexed = False
+        self.sorted_ids = None
+
+    def sync(self) -> None:
+        """Pick up the notes other sessions wrote; call with the store locked."""
+        changes = self.store.changes()
+        if changes is None:
+            # another session compacted the notes
+            self.data = self.store.open()
+            self.index.clear()
+            self.indexed = False
+        else:
+            for note_id, location in changes.items():
+                if self.indexed and note_id in self.data:
+                    self.index.remove(self[note_id])
+                if location is None:
+                    self.data.pop(note_id, None)
+                    continue
+                self.data[note_id] = location
+                if self.indexed:
+                    self.index.add(self[note_id])
+        if changes != {}:
+            self.sorted_ids = None
+
+    def refresh(self) -> None:
+        with self.store.locked():
+            self.sync()
+
+    def version(self, note_id: int):
+        """Version stamp of the note, None if there is no such note."""
+        if note_id not in self.data:
+            return None
+        return self[note_id].get("version", 0)
+
+    def stale(self, note_id: int) -> bool:
+        """True if the note changed since this session showed it; call after sync()."""
+        version = self.version(note_id)
+        return self.seen.get(note_id, version) != version
+
+    def show_note(self, note: dict) -> None:
+        self.seen[note["id"]] = note.get("version", 0)
+        print(f"Note: {note['id']}, Text: {note['text']}, Tags: {note['tags']}")
+
+    @staticmethod
+    def migrate(data) -> dict:
+        """Notes saved as a list are numbered in their list order."""
+        if isinstance(data, dict):
+            return data
+        notes = {}
+        for note in data:
+            note["id"] = len(notes)
+            notes[note["id"]] = note
+        return notes
+
+    def search_index(self) -> NoteIndex:
+        if not self.indexed:
+            for note in self.values():
+                self.index.add(note)
+            self.indexed = True
+        return self.index
+
+    def new_note(self, text: str) -> dict:
+        # call with the store locked and synced, the id is taken when the note is appended
+        return {"text": text, "tags": self.extract_tags(text), "id": self.store.next_id, "version": 1}
+
+    @metrics.timed_storage("notes.save")
     def save_notes(self):
-        with open(save_file, "wb") as file:
-            pickle.dump(self.data, file)
-            print("Notes saved successfully")
+        # notes are written as they change, only drop the old versions
+        with self.store.locked():
+            self.sync()
+            live = sum(length for _, length in self.data.values())
+            if self.store.size > 2 * live:
+                self.data = self.store.compact(self.data)
+        print("Notes saved successfully")
 
     def add_note(self, text):
-        tags = self.extract_tags(text)
-        self.data.append({"text": text, "tags": tags})
+        with self.store.locked():
+            self.sync()
+            note = self.new_note(text)
+            self.data[note["id"]] = self.store.append(note)
+            self.seen[note["id"]] = note["version"]
+        if self.indexed:
+            self.index.add(note)
+        self.sorted_ids = None
         print("The note is added to the notepad")
 
+    def ordered_ids(self):
+        if not self.sort_by_tags:
+            return self.data.keys()
+        if self.sorted_ids is None:
+            self.sorted_ids = sorted(self.data, key=lambda note_id: len(self[note_id]["tags"]))
+        return self.sorted_ids
+
     def display_all_notes(self):
+        self.refresh()
         print("\n===== All notes from notebook =====")
-        for index, note in enumerate(self.data):
-            print(f"Note: {index}, Text: {note['text']}, Tags: {note['tags']}")
+        for note_id in self.ordered_ids():
+            self.show_note(self[note_id])
         print("==============================\n")
 
     def extract_tags(self, text: str) -> list:
         tags = [word[1:] for word in text.split() if word.startswith("#")]
         return tags
 
-    def search_notes(self, search_text: str):
-        matching_notes = []
-        for index, note in enumerate(self.data):
-            if search_text.lower() in note["text"].lower():
-                matching_notes.append((index, note))
-
-        if matching_notes:
+    def show_found(self, note_ids) -> None:
+        if note_ids:
             print("Found records:")
-            for index, note in matching_notes:
-                print(f"Note: {index}, Text: {note['text']}, Tags: {note['tags']}")
+            for note_id in note_ids:
+                self.show_note(self[note_id])
         else:
             print("There are no records matching your search query")
 
-    def sort_notes_by_tags(self):
-        self.data.sort(key=lambda note: len(note["tags"]))
-
-    def change_note(self, note_index: int, new_text: str):
-        if 0 <= note_index < len(self.data):
-            tags = self.extract_tags(new_text)
-            self.data[note_index] = {"text": new_text, "tags": tags}
-            print(f"Record with index {note_index} changed in notebook")
-        else:
-            print("The specified entry index does not exist")
+    def search_notes(self, search_text: str):
+        self.refresh()
+        note_ids = self.search_index().search_words(search_text, len(self.data))
+        if not note_ids:
+            # parts of words are not in the index
+            note_ids = [
+                note_id for note_id, note in self.items()
+                if search_text.lower() in note["text"].lower()
+            ]
+        self.show_found(note_ids)
+
+    def search_tags(self, tags: list, match_all: bool = True):
+        self.refresh()
+        self.show_found(sorted(self.search_index().search_tags(tags, match_all)))
 
-    def delete_note(self, note_index: int):
-        if 0 <= note_index < len(self.data):
-            del self.data[note_index]
-            print(f"Record with index {note_index} deleted in notenook")
+    def sort_notes_by_tags(self):
+        self.sort_by_tags = True
+
+    def change_note(self, note_id: int, new_text: str):
+        # bodies are read only after sync, another session may have compacted them
+        with self.store.locked():
+            self.sync()
+            if note_id not in self.data:
+                print("The specified entry index does not exist")
+                return
+            if self.stale(note_id):
+                print(CONFLICT_MESSAGE.format(note_id))
+                return
+            old = self[note_id]
+            if self.indexed:
+                self.index.remove(old)
+            note = {
+                "text": new_text,
+                "tags": self.extract_tags(new_text),
+                "id": note_id,
+                "version": old.get("version", 0) + 1,
+            }
+            self.data[note_id] = self.store.append(note)
+            self.seen[note_id] = note["version"]
+        if self.indexed:
+            self.index.add(note)
+        self.sorted_ids = None
+        print(f"Record with index {note_id} changed in notebook")
+
+    def delete_note(self, note_id: int):
+        with self.store.locked():
+            self.sync()
+            if note_id not in self.data:
+                print("The specified entry index does not exist")
+                return
+            if self.stale(note_id):
+                print(CONFLICT_MESSAGE.format(note_id))
+                return
+            if self.indexed:
+                self.index.remove(self[note_id])
+            del self.data[note_id]
+            self.seen.pop(note_id, None)
+            self.store.delete(note_id)
+        self.sorted_ids = None
+        print(f"Record with index {note_id} deleted in notenook")
+
+
+notebook = None
+
+
+def get_notebook() -> NoteBook:
+    """The notebook, loaded from disk on first use."""
+    global notebook
+    if notebook is None:
+        # EXPONENTA_STORAGE=sqlite keeps the notes in notes.db
+        if os.environ.get("EXPONENTA_STORAGE") == "sqlite":
+            from .note_sql import SqliteNoteBook
+
+            notebook = SqliteNoteBook()
         else:
-            print("The specified entry index does not exist")
-
-
-notebook = NoteBook()
+            notebook = NoteBook()
+    return notebook
 
 
 def add(text: list):
-    notebook.add_note(" ".join(text))
+    get_notebook().add_note(" ".join(text))
 
 
 def show(_: list):
-    notebook.display_all_notes()
+    get_notebook().display_all_notes()
 
 
 def sort(_: list):
-    notebook.sort_notes_by_tags()
+    get_notebook().sort_notes_by_tags()
     print("Records sorted")
 
 
 def find(text: list):
-    notebook.search_notes(" ".join(text))
+    get_notebook().search_notes(" ".join(text))
+
+
+def tags(text: list):
+    get_notebook().search_tags(text)
+
+
+def tags_any(text: list):
+    get_notebook().search_tags(text, match_all=False)
 
 
 def change(text: list):
-    notebook.change_note(int(text[0]), " ".join(text[1:]))
+    get_notebook().change_note(int(text[0]), " ".join(text[1:]))
 
 
 def delete(text: list):
-    notebook.delete_note(int(text[0]))
+    get_notebook().delete_note(int(text[0]))
+
+
+def stats(text: list):
+    print(metrics.report(*text[:1]))
 
 
 def help(_: list = None):
@@ -114,9 +521,12 @@ def help(_: list = None):
     print("add <any string>       - add new record to notebook")
     print("show                   - show all records")
     print("sort                   - sort records by tags")
-    print("find <text>            - find records by part")
+    print("find <text>            - find records by words, best matches first")
+    print("tags <tag> [tag ...]   - find records with all of the tags")
+    print("tags_any <tag> [tag ...] - find records with any of the tags")
     print("change <number> <text> - changing a record by its number")
-    print("delete <number>        - removing a record by its number")
+    print("delete <number>        - removing a record by its number (numbers never change)")
+    print("stats [prometheus]     - command latencies, errors and storage traffic (EXPONENTA_METRICS)")
     print("help                   - notebook commands list")
     print("exit                   - leave notebook")
     print("==============================\n")
@@ -127,16 +537,20 @@ COMMANDS = {
     "show": show,
     "sort": sort,
     "find": find,
+    "tags": tags,
+    "tags_any": tags_any,
     "change": change,
     "delete": delete,
     "help": help,
+    "stats": stats,
 }
+COMMANDS = {keyword: metrics.timed_command(keyword, func) for keyword, func in COMMANDS.items()}
 
 
 def parser(text: str):
-    text = text.strip().split()
-    if text[0] in COMMANDS:
-        COMMANDS[text[0]](text[1:])
+    keyword, args = split_command(text)
+    if keyword in COMMANDS:
+        COMMANDS[keyword](args)
     else:
         print("Wrong command. Please try again.")
 
@@ -146,7 +560,7 @@ def note_main():
     while True:
         choice = input("Enter your command >>> ")
         if choice.lower().startswith(("exit", "close", "quit")):
-            notebook.save_notes()
+            get_notebook().save_notes()
             break
         parser(choice)
 
@@ -0,0 +1,193 @@
+"""NoteBook kept in an SQLite database.
+
+Used when EXPONENTA_STORAGE=sqlite. Tags are indexed in their own table
+and note text in an FTS5 table, searches run as SQL queries. If the
+sqlite3 build has no FTS5, text search scans the notes.
+"""
+from pathlib import Path
+import sqlite3
+
+from .note import NoteBook, NoteIndex, index_file, save_file
+
+db_file = Path("notes.db")
+BUSY_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS note_tags (
+    note_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    tag_key TEXT NOT NULL,
+    PRIMARY KEY (note_id, position)
+);
+CREATE INDEX IF NOT EXISTS note_tags_tag ON note_tags (tag_key, note_id);
+CREATE TABLE IF NOT EXISTS note_ids (
+    next_id INTEGER NOT NULL
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(text, content='notes', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF text ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO notes_fts (rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+
+class SqliteNoteBook:
+    """Same commands as NoteBook, with the notes in notes.db."""
+
+    extract_tags = NoteBook.extract_tags
+    show_found = NoteBook.show_found
+    show_note = NoteBook.show_note
+    sort_notes_by_tags = NoteBook.sort_notes_by_tags
+
+    def __init__(self, path: Path = db_file):
+        self.path = path
+        self.sort_by_tags = False
+        self.fts = False
+        self.db = None
+        self.seen = {}
+        self.load_notes()
+
+    def load_notes(self):
+        created = not self.path.exists()
+        self.db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.db.create_function("lower_text", 1, str.lower, deterministic=True)
+        try:
+            self.db.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # sqlite3 built without FTS5
+            pass
+        if created and (index_file.exists() or save_file.exists()):
+            self.migrate()
+        elif created:
+            print("Notes file not found. A new notepad has been created.")
+        else:
+            print("Notebook succefully load")
+
+    def migrate(self):
+        """Copy the notes of the file notebook into the new database."""
+        notes = NoteBook()
+        for note_id, note in notes.items():
+            self.insert(note_id, note["text"], note.get("version", 1))
+        self.db.commit()
+
+    def __getitem__(self, note_id: int) -> dict:
+        row = self.db.execute("SELECT text, version FROM notes WHERE id = ?", (note_id,)).fetchone()
+        if row is None:
+            raise KeyError(note_id)
+        text, version = row
+        return {"text": text, "tags": self.extract_tags(text), "id": note_id, "version": version}
+
+    def __contains__(self, note_id) -> bool:
+        return self.db.execute("SELECT 1 FROM notes WHERE id = ?", (note_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT count(*) FROM notes").fetchone()[0]
+
+    def insert(self, note_id, text: str, version: int = 1) -> int:
+        # ids of deleted notes are not given out again
+        next_id = self.db.execute(
+            "SELECT coalesce(max(next_id), (SELECT max(id) + 1 FROM notes), 0) FROM note_ids"
+        ).fetchone()[0]
+        if note_id is None:
+            note_id = next_id
+        self.db.execute(
+            "INSERT INTO notes (id, text, version) VALUES (?, ?, ?)", (note_id, text, version)
+        )
+        self.db.execute("DELETE FROM note_ids")
+        self.db.execute("INSERT INTO note_ids (next_id) VALUES (?)", (max(next_id, note_id + 1),))
+        self.write_tags(note_id, text)
+        return note_id
+
+    def write_tags(self, note_id: int, text: str) -> None:
+        self.db.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
+        self.db.executemany(
+            "INSERT INTO note_tags (note_id, position, tag, tag_key) VALUES (?, ?, ?, ?)",
+            [(note_id, i, tag, tag.lower()) for i, tag in enumerate(self.extract_tags(text))],
+        )
+
+    def save_notes(self):
+        self.db.commit()
+        print("Notes saved successfully")
+
+    def add_note(self, text):
+        with self.db:
+            self.insert(None, text)
+        print("The note is added to the notepad")
+
+    def display_all_notes(self):
+        order = "(SELECT count(*) FROM note_tags WHERE note_id = id), id" if self.sort_by_tags else "id"
+        print("\n===== All notes from notebook =====")
+        for note_id, text in self.db.execute(f"SELECT id, text FROM notes ORDER BY {order}"):
+            print(f"Note: {note_id}, Text: {text}, Tags: {self.extract_tags(text)}")
+        print("==============================\n")
+
+    def search_notes(self, search_text: str):
+        note_ids = []
+        words = NoteIndex.tokenize(search_text)
+        if self.fts and words:
+            # any of the words, best matches first like NoteIndex.search_words
+            query = " OR ".join('"{}"'.format(word.replace('"', '""')) for word in words)
+            rows = self.db.execute(
+                "SELECT rowid FROM notes_fts WHERE notes_fts MATCH ? ORDER BY rank, rowid", (query,)
+            )
+            note_ids = [note_id for note_id, in rows]
+        if not note_ids:
+            # parts of words are not in the index
+            rows = self.db.execute(
+                "SELECT id FROM notes WHERE instr(lower_text(text), ?) ORDER BY id",
+                (search_text.lower(),),
+            )
+            note_ids = [note_id for note_id, in rows]
+        self.show_found(note_ids)
+
+    def search_tags(self, tags: list, match_all: bool = True):
+        keys = sorted({tag.lower().lstrip("#") for tag in tags})
+        note_ids = []
+        if keys:
+            having = f"HAVING count(DISTINCT tag_key) = {len(keys)}" if match_all else ""
+            rows = self.db.execute(
+                f"SELECT note_id FROM note_tags WHERE tag_key IN ({','.join('?' * len(keys))}) "
+                f"GROUP BY note_id {having} ORDER BY note_id",
+                keys,
+            )
+            note_ids = [note_id for note_id, in rows]
+        self.show_found(note_ids)
+
+    def change_note(self, note_id: int, new_text: str):
+        with self.db:
+            changed = self.db.execute(
+                "UPDATE notes SET text = ?, version = version + 1 WHERE id = ?", (new_text, note_id)
+            ).rowcount
+            if changed:
+                self.write_tags(note_id, new_text)
+        if changed:
+            print(f"Record with index {note_id} changed in notebook")
+        else:
+            print("The specified entry index does not exist")
+
+    def delete_note(self, note_id: int):
+        with self.db:
+            deleted = self.db.execute("DELETE FROM notes WHERE id = ?", (note_id,)).rowcount
+            self.db.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
+        if deleted:
+            print(f"Record with index {note_id} deleted in notenook")
+        else:
+            print("The specified entry index does not exist")
@@ -1,8 +1,23 @@
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import cProfile
+import gzip
+import hashlib
+import json
 import os
 from pathlib import Path
+from queue import Queue
 import re
 import shutil
-from zipfile import ZipFile
+import tarfile
+from threading import Lock, Thread
+from time import perf_counter
+from zipfile import BadZipFile, ZipFile
+import zlib
+
+from .file_transfer import DEFAULT_TRANSFER, Transfer
 
 CATEGORIES = {"audio": [".mp3", ".wav", ".flac", ".wma"],
               "video": [".mkv", ".avi", ".mov", ".mp4"],
@@ -11,20 +26,39 @@ CATEGORIES = {"audio": [".mp3", ".wav", ".flac", ".wma"],
               "docs": [".doc", ".docx", ".txt", ".pdf", ".xlsx", ".pptx"]
               }
 
-file_list = {"audio": [],
-             "video": [],
-             "images": [],
-             "archives": [],
-             "docs": [],
-             "other": []
-             }
-ext_list = {"audio": [],
-            "video": [],
-            "images": [],
-            "archives": [],
-            "docs": [],
-            "other": []
-            }
+CONFIG_FILE = Path.home().joinpath(".exponenta_categories.json")
+
+
+def build_extensions(categories: dict) -> dict:
+    return {ext.lower(): cat for cat, exts in categories.items() for ext in exts}
+
+
+EXTENSIONS = build_extensions(CATEGORIES)
+
+
+def load_categories(config: Path = CONFIG_FILE) -> dict:
+    """Replace CATEGORIES with {"category": [".ext", ...]} from a JSON config file."""
+    global CATEGORIES, EXTENSIONS
+    with open(config) as fh:
+        categories = json.load(fh)
+    CATEGORIES = {cat: [ext.lower() for ext in exts] for cat, exts in categories.items()}
+    EXTENSIONS = build_extensions(CATEGORIES)
+    return CATEGORIES
+
+
+class SortReport:
+    """Names and extensions moved to every category during one run.
+
+    Dicts with None values keep insertion order and give O(1) membership.
+    """
+
+    def __init__(self):
+        self.files = {cat: {} for cat in [*CATEGORIES, "other"]}
+        self.exts = {cat: {} for cat in [*CATEGORIES, "other"]}
+
+    def add(self, new_path: Path, category: str) -> None:
+        self.files.setdefault(category, {})[new_path.name] = None
+        self.exts.setdefault(category, {})[new_path.suffix] = None
 
 CYRILLIC_SYMBOLS = "абвгдеёжзийклмнопрстуфхцчшщъыьэюяєіїґ"
 TRANSLATION = ("a", "b", "v", "g", "d", "e", "e", "j", "z", "i", "j", "k", "l", "m", "n", "o", "p", "r", "s", "t", "u",
@@ -41,62 +75,778 @@ def normalize(file: Path) -> str:
     return new_name
 
 
-def write_in_file(file_list: dict, ext_list: dict, path: Path) -> None:
+def report_files(path: Path, category: str) -> tuple:
+    return (
+        path.joinpath(category).joinpath(category + ".txt"),
+        path.joinpath(category).joinpath(category + "_ext.txt"),
+    )
+
+
+def write_report(file_path: Path, lines, patch: bool) -> None:
+    if patch:
+        if not lines:
+            return
+        if file_path.exists():
+            old_lines = dict.fromkeys(file_path.read_text().splitlines())
+            lines = {**old_lines, **dict.fromkeys(lines)}
+            if len(lines) == len(old_lines):
+                return
+    with open(file_path, "w") as fh:
+        fh.write("\n".join(lines))
+
+
+def write_in_file(file_list: dict, ext_list: dict, path: Path, patch: bool = False) -> None:
+    """Write <category>.txt and <category>_ext.txt; with patch only add new lines to them."""
     for k, v in file_list.items():
-        text = "\n".join(v)
-        file_path = path.joinpath(k).joinpath(k + ".txt")
-        with open(file_path, "w") as fh:
-            fh.write(text)
+        if not path.joinpath(k).is_dir():
+            continue
+        write_report(report_files(path, k)[0], v, patch)
     for k, v in ext_list.items():
-        text = "\n".join(v)
-        file_path = path.joinpath(k).joinpath(k + "_ext.txt")
-        with open(file_path, "w") as fh:
-            fh.write(text)
+        if not path.joinpath(k).is_dir():
+            continue
+        write_report(report_files(path, k)[1], v, patch)
 
 
 def get_category(file: Path) -> str:
-    ext = file.suffix.lower()
-    for cat, exts in CATEGORIES.items():
-        if ext in exts:
-            return cat
-    return "other"
-
-
-def unpack_archive(directory: Path, archive: Path) -> None:
-    dir_name = archive.name.rstrip(archive.suffix)
-    unpack_path = directory.joinpath(dir_name)
-    if archive.suffix.lower() == ".zip":
-        with ZipFile(archive, "r") as zObj:
-            zObj.extractall(unpack_path)
-    else:
-        shutil.unpack_archive(archive, unpack_path, archive.suffix)
+    return EXTENSIONS.get(file.suffix.lower(), "other")
+
+
+MAX_MEMBER_SIZE = 1 << 30
+MAX_UNPACKED_SIZE = 4 << 30
+CHUNK_SIZE = 1 << 20
+
+
+class ArchiveError(Exception):
+    ...
+
+
+class Unpacker:
+    """Writes archive members one by one with a fixed buffer and size limits."""
+
+    def __init__(self, unpack_path: Path, max_member: int, max_total: int):
+        self.unpack_path = unpack_path
+        self.max_member = max_member
+        self.max_total = max_total
+        self.total = 0
+        self.files = []
+
+    def target(self, name: str):
+        target = self.unpack_path.joinpath(name)
+        if not target.resolve().is_relative_to(self.unpack_path.resolve()):
+            return None
+        return target
 
+    def write(self, source, name: str) -> None:
+        target = self.target(name)
+        if target is None:
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        written = 0
+        with open(target, "wb") as fh:
+            while chunk := source.read(CHUNK_SIZE):
+                written += len(chunk)
+                self.total += len(chunk)
+                if written > self.max_member or self.total > self.max_total:
+                    raise ArchiveError(f"{name} unpacks over the size limit")
+                fh.write(chunk)
+        self.files.append(target)
 
-def move_file(file: Path, category: str, root_dir: Path) -> None:
+
+def unpack_archive(
+    directory: Path,
+    archive: Path,
+    max_member: int = MAX_MEMBER_SIZE,
+    max_total: int = MAX_UNPACKED_SIZE,
+) -> list:
+    """Unpack zip, tar and gz archives into directory/<archive name>.
+
+    Members are streamed, and their real unpacked sizes are checked against
+    the limits, so a zip bomb stops at the limit. On any error the unpacked
+    part is removed. Returns the unpacked files.
+    """
+    unpack_path = directory.joinpath(archive.stem)
+    unpacker = Unpacker(unpack_path, max_member, max_total)
+    try:
+        if archive.suffix.lower() == ".zip":
+            with ZipFile(archive, "r") as zObj:
+                for member in zObj.infolist():
+                    if not member.is_dir():
+                        with zObj.open(member) as source:
+                            unpacker.write(source, member.filename)
+        elif tarfile.is_tarfile(archive):
+            with tarfile.open(archive, "r|*") as tObj:
+                for member in tObj:
+                    if member.isfile():
+                        unpacker.write(tObj.extractfile(member), member.name)
+        else:
+            with gzip.open(archive, "rb") as source:
+                unpacker.write(source, archive.stem)
+    except (
+        ArchiveError, BadZipFile, tarfile.TarError, EOFError, OSError, zlib.error,
+        # encrypted or unsupported zip members
+        RuntimeError, NotImplementedError,
+    ) as e:
+        shutil.rmtree(unpack_path, ignore_errors=True)
+        raise ArchiveError(f"Can't unpack {archive.name}: {e}") from e
+    return unpacker.files
+
+
+def transfer(
+    file: Path, category: str, root_dir: Path, new_path: Path = None, mover: Transfer = DEFAULT_TRANSFER
+) -> Path:
     target_dir = root_dir.joinpath(category)
-    if not target_dir.exists():
-        target_dir.mkdir()
-    new_path = target_dir.joinpath(normalize(file))
-    file.replace(new_path)
-    if new_path.name not in file_list[category]:
-        file_list[category].append(new_path.name)
-    if new_path.suffix not in ext_list[category]:
-        ext_list[category].append(new_path.suffix)
+    target_dir.mkdir(exist_ok=True)
+    new_path = new_path or target_dir.joinpath(normalize(file))
+    mover.move(file, new_path)
+    return new_path
+
+
+class Deduplicator:
+    """Finds byte-identical files and gives clash-free target names.
+
+    Files are compared by size, then by a hash of the first block, then by
+    a hash of the whole content. Duplicates are either only reported
+    (mode "report", they stay where they are) or replaced by hard links to
+    the first copy (mode "link").
+    """
+
+    block_size = 1 << 16
+
+    def __init__(self, mode: str = "report"):
+        if mode not in ("report", "link"):
+            raise ValueError(f"Unknown dedup mode {mode}")
+        self.mode = mode
+        self.originals = {}
+        self.targets = {}
+        self.claimed = set()
+        self.duplicates = []
+        self.hashed = 0
+
+    def hash_file(self, file: Path, limit: int = None) -> str:
+        digest = hashlib.sha256()
+        buffer = bytearray(self.block_size)
+        view = memoryview(buffer)
+        left = limit
+        with open(file, "rb") as fh:
+            while left is None or left > 0:
+                size = fh.readinto(buffer)
+                if not size:
+                    break
+                if left is not None:
+                    size = min(size, left)
+                    left -= size
+                digest.update(view[:size])
+                self.hashed += size
+        return digest.hexdigest()
+
+    def group(self, files: list, key) -> list:
+        groups = defaultdict(list)
+        for file in files:
+            groups[key(file)].append(file)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def find(self, files: list, kept: list = ()) -> None:
+        """Map every duplicate in files to its original; kept files are preferred as originals."""
+        for file in kept:
+            self.targets[file] = file
+        kept_set = set(kept)
+        for same_size in self.group([*kept, *files], lambda f: f.stat().st_size):
+            # groups of files from earlier runs were checked already
+            if kept_set.issuperset(same_size):
+                continue
+            small = same_size[0].stat().st_size <= self.block_size
+            for same_start in self.group(
+                same_size, lambda f: self.hash_file(f, self.block_size)
+            ):
+                same_content = [same_start] if small else self.group(same_start, self.hash_file)
+                for group in same_content:
+                    for duplicate in group[1:]:
+                        if duplicate not in kept_set:
+                            self.originals[duplicate] = group[0]
+
+    def target(self, file: Path, category: str, root_dir: Path) -> Path:
+        """Path in the category folder that no other file has or was given."""
+        name = Path(normalize(file))
+        target = root_dir.joinpath(category).joinpath(name)
+        number = 0
+        while target in self.claimed or (target.exists() and target != file):
+            number += 1
+            target = target.with_name(f"{name.stem}_{number}{name.suffix}")
+        self.claimed.add(target)
+        self.targets[file] = target
+        return target
+
+    def settle(self, duplicate: Path, category: str, root_dir: Path):
+        """Handle a duplicate once its original is moved; returns its new path in link mode."""
+        original = self.targets[self.originals[duplicate]]
+        if self.mode == "report":
+            self.duplicates.append((duplicate, original))
+            return None
+        target = self.target(duplicate, category, root_dir)
+        target.parent.mkdir(exist_ok=True)
+        temporary = target.with_name(f".{target.name}.link")
+        try:
+            os.link(original, temporary)
+        except OSError as e:
+            # no hard links on this filesystem (FAT, SMB), or too many of them
+            print(f"Can't link {duplicate} to {original}: {e}")
+            self.claimed.discard(target)
+            self.targets[duplicate] = duplicate
+            self.duplicates.append((duplicate, original))
+            return None
+        os.replace(temporary, target)
+        # the duplicate goes only once the link is in place
+        duplicate.unlink()
+        self.duplicates.append((target, original))
+        return target
+
+
+def write_duplicates(dedup: Deduplicator, path: Path) -> None:
+    with open(path.joinpath("duplicates.txt"), "w") as fh:
+        fh.write("\n".join(f"{d} -> {o}" for d, o in dedup.duplicates))
+
+
+def move_file(
+    file: Path, category: str, root_dir: Path, report: SortReport, new_path: Path = None
+) -> None:
+    new_path = transfer(file, category, root_dir, new_path)
+    report.add(new_path, category)
     if category == "archives":
-        unpack_archive(target_dir, new_path)
+        unpack_archive(new_path.parent, new_path)
+
+
+def sort_folder(path: Path, dedup: Deduplicator = None) -> SortReport:
+    report = SortReport()
+    files = [i for i in path.glob("**/*") if i.is_file()]
+    if dedup:
+        dedup.find(files)
+    for i in files:
+        category = get_category(i)
+        if not dedup:
+            move_file(i, category, path, report)
+        elif i in dedup.originals:
+            new_path = dedup.settle(i, category, path)
+            if new_path:
+                report.add(new_path, category)
+        else:
+            move_file(i, category, path, report, dedup.target(i, category, path))
+    return report
+
+
+class EmptyFolders:
+    """Entry counts of the folders under root, kept up to date as files move.
+
+    The counts come from the walk that finds the files, so the folders left
+    empty are removed bottom-up in one pass without listing them again.
+    Folders are kept in walk order, parents before their subfolders.
+    """
+
+    def __init__(self, root: Path):
+        self.root = str(root)
+        self.counts = {}
+        self.lock = Lock()
+
+    def add_folder(self, folder: str, entries: int) -> None:
+        self.counts[folder] = entries
 
+    def moved(self, old: Path, new: Path) -> None:
+        old, new = os.path.dirname(old), os.path.dirname(new)
+        if old == new:
+            return
+        with self.lock:
+            if old in self.counts:
+                self.counts[old] -= 1
+            if new in self.counts:
+                self.counts[new] += 1
 
-def sort_folder(path: Path) -> None:
-    for i in path.glob("**/*"):
-        if i.is_file():
-            category = get_category(i)
-            move_file(i, category, path)
+    def extracted(self, files: list, directory: Path) -> None:
+        """Count unpacked files and the folders made for them under directory."""
+        top = str(directory)
+        with self.lock:
+            for file in files:
+                folder = os.path.dirname(file)
+                new = []
+                while folder != top and folder not in self.counts:
+                    new.append(folder)
+                    folder = os.path.dirname(folder)
+                for folder in reversed(new):
+                    parent = os.path.dirname(folder)
+                    if parent in self.counts:
+                        self.counts[parent] += 1
+                    self.counts[folder] = 0
+                folder = os.path.dirname(file)
+                if folder in self.counts:
+                    self.counts[folder] += 1
 
+    def prune(self, profile: "SortProfile" = None) -> int:
+        """Remove the folders left empty, deepest first; returns how many were removed."""
+        removed = 0
+        for folder in reversed(self.counts):
+            if self.counts[folder] or folder == self.root:
+                continue
+            try:
+                os.rmdir(folder)
+            except OSError:
+                # something was put there outside the sorter
+                continue
+            removed += 1
+            parent = os.path.dirname(folder)
+            if parent in self.counts:
+                self.counts[parent] -= 1
+        if profile:
+            profile.add("prune", items=len(self.counts))
+        return removed
 
-def delete_empty_folders(path: Path) -> None:
-    for i in path.rglob("**/*"):
-        if i.is_dir() and not os.listdir(i):
-            shutil.rmtree(i)
+
+def scan_files(path: Path, folders: EmptyFolders = None):
+    """Files under path in the same order as path.glob("**/*"), using os.scandir.
+
+    Manifests of earlier sorts are never returned. With folders, the entry
+    count of every folder is recorded in it.
+    """
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        subdirs = []
+        with os.scandir(directory) as entries:
+            entries = list(entries)
+            if folders:
+                folders.add_folder(str(directory), len(entries))
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file() and entry.name != Manifest.file_name:
+                    yield Path(entry.path)
+        stack.extend(reversed(subdirs))
+
+
+class Manifest:
+    """(size, mtime, category) of every sorted file, saved in the sorted folder."""
+
+    file_name = ".sort_manifest.json"
+
+    def __init__(self, root: Path, load: bool = True):
+        self.root = root
+        self.file = root.joinpath(self.file_name)
+        self.entries = {}
+        self.seen = {}
+        self.reports = set()
+        if load and self.file.exists():
+            with open(self.file) as fh:
+                self.entries = json.load(fh)
+
+    def key(self, file: Path) -> str:
+        return file.relative_to(self.root).as_posix()
+
+    def unchanged(self, file: Path) -> bool:
+        if file == self.file or file in self.reports:
+            return True
+        key = self.key(file)
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        stat = file.stat()
+        if entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+            return False
+        self.seen[key] = entry
+        return True
+
+    def add(self, file: Path, category: str) -> None:
+        stat = file.stat()
+        self.seen[self.key(file)] = [stat.st_size, stat.st_mtime_ns, category]
+
+    def save(self) -> None:
+        # files that were not met in this run are gone
+        self.entries = self.seen
+        self.seen = {}
+        with open(self.file, "w") as fh:
+            json.dump(self.entries, fh)
+
+
+class SortProgress:
+    def __init__(self):
+        self.lock = Lock()
+        self.scanned = 0
+        self.skipped = 0
+        self.moved = 0
+        self.duplicates = 0
+        self.extracted = 0
+        self.errors = 0
+
+    def add(self, counter: str, value: int = 1) -> None:
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + value)
+
+    def __str__(self):
+        return (
+            f"scanned: {self.scanned}, skipped: {self.skipped}, moved: {self.moved}, "
+            f"duplicates: {self.duplicates}, extracted: {self.extracted}, errors: {self.errors}"
+        )
+
+
+class SortProfile:
+    """Time, items and bytes of a sort run by phase and by category.
+
+    Moves run on threads and extraction on processes, so the times of those
+    phases are summed over the workers and can be more than the wall time.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        # [seconds, items, bytes]
+        self.phases = defaultdict(lambda: [0.0, 0, 0])
+        # [seconds, files, bytes] of the moves
+        self.categories = defaultdict(lambda: [0.0, 0, 0])
+        self.wall = 0.0
+
+    def add(
+        self, phase: str, seconds: float = 0.0, items: int = 0, size: int = 0, category: str = None
+    ) -> None:
+        with self.lock:
+            stats = self.phases[phase]
+            stats[0] += seconds
+            stats[1] += items
+            stats[2] += size
+            if category:
+                stats = self.categories[category]
+                stats[0] += seconds
+                stats[1] += items
+                stats[2] += size
+
+    @contextmanager
+    def phase(self, name: str, items: int = 0):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start, items)
+
+    def timed(self, source, phase: str):
+        """Items of source, adding the time spent getting each one to phase."""
+        source = iter(source)
+        while True:
+            start = perf_counter()
+            item = next(source, None)
+            if item is None:
+                self.add(phase, perf_counter() - start)
+                return
+            self.add(phase, perf_counter() - start, 1)
+            yield item
+
+    def as_dict(self) -> dict:
+        return {
+            "wall": self.wall,
+            "phases": {
+                name: dict(zip(("seconds", "items", "bytes"), stats))
+                for name, stats in self.phases.items()
+            },
+            "categories": {
+                name: dict(zip(("seconds", "files", "bytes"), stats))
+                for name, stats in sorted(self.categories.items())
+            },
+        }
+
+    def __str__(self):
+        lines = [f"{'phase':<12} {'seconds':>10} {'items':>9} {'bytes':>14}"]
+        for name, (seconds, items, size) in self.phases.items():
+            lines.append(f"{name:<12} {seconds:>10.3f} {items:>9} {size:>14,}")
+        lines.append(f"{'wall':<12} {self.wall:>10.3f}")
+        lines.append(f"\n{'category':<12} {'seconds':>10} {'files':>9} {'bytes':>14}")
+        for name, (seconds, files, size) in sorted(self.categories.items()):
+            lines.append(f"{name:<12} {seconds:>10.3f} {files:>9} {size:>14,}")
+        return "\n".join(lines)
+
+
+def profiled_unpack(directory: Path, archive: Path) -> tuple:
+    """unpack_archive that also returns its time and the unpacked bytes, for SortProfile."""
+    start = perf_counter()
+    files = unpack_archive(directory, archive)
+    seconds = perf_counter() - start
+    return files, seconds, sum(file.stat().st_size for file in files)
+
+
+def sort_folder_pipeline(
+    path: Path,
+    workers: int = None,
+    queue_size: int = 1000,
+    progress: SortProgress = None,
+    manifest: Manifest = None,
+    dedup: Deduplicator = None,
+    profile: SortProfile = None,
+    folders: EmptyFolders = None,
+    output: Path = None,
+    mover: Transfer = DEFAULT_TRANSFER,
+) -> SortReport:
+    """Sort path with a scandir walker feeding a bounded queue of moves.
+
+    Moves run on a pool of threads and archives are unpacked on a process
+    pool. Unpacked files are sorted in the next round, and the report is
+    filled in walk order, as sort_folder does. With a manifest, files it
+    already lists unchanged are left in place. With a deduplicator,
+    identical files are found before moving and handled after it. With a
+    profile, the phases are timed into it. With folders, the entry counts
+    of the walked and unpacked folders are kept in it for pruning. The
+    category folders are made in output, path itself if it is not given,
+    and files get there with mover.
+    """
+    root_dir = output or path
+    workers = workers or os.cpu_count() or 1
+    progress = progress or SortProgress()
+    report = SortReport()
+    sources = [scan_files(path, folders)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while sources:
+            archives = []
+            skip = manifest.unchanged if manifest else None
+            moved = move_files(
+                sources, root_dir, workers, queue_size, progress, skip, dedup, profile, folders, mover
+            )
+            for new_path, category in moved:
+                report.add(new_path, category)
+                if manifest:
+                    manifest.add(new_path, category)
+                if category == "archives" and new_path not in archives:
+                    archives.append(new_path)
+            unpack = profiled_unpack if profile else unpack_archive
+            jobs = [(a, pool.submit(unpack, a.parent, a)) for a in archives]
+            sources = []
+            for archive, job in jobs:
+                try:
+                    files = job.result()
+                    if profile:
+                        files, seconds, size = files
+                        profile.add("extract", seconds, len(files), size)
+                    if folders:
+                        folders.extracted(files, archive.parent)
+                    sources.append(files)
+                    progress.add("extracted")
+                except ArchiveError as e:
+                    print(e)
+                    progress.add("errors")
+    return report
+
+
+def move_files(
+    sources: list,
+    root_dir: Path,
+    workers: int,
+    queue_size: int,
+    progress: SortProgress,
+    skip=None,
+    dedup: Deduplicator = None,
+    profile: SortProfile = None,
+    folders: EmptyFolders = None,
+    mover: Transfer = DEFAULT_TRANSFER,
+) -> list:
+    """Move the files of every source into root_dir, returning (new_path, category) in walk order."""
+    tasks = Queue(maxsize=queue_size)
+    moved = []
+    failures = []
+
+    def worker():
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            index, file, category, new_path = task
+            try:
+                if profile:
+                    new_path = profiled_transfer(file, category, root_dir, new_path, profile, mover)
+                else:
+                    new_path = transfer(file, category, root_dir, new_path, mover)
+                if folders:
+                    folders.moved(file, new_path)
+                moved.append((index, new_path, category))
+                progress.add("moved")
+            except OSError as e:
+                # an unreadable or locked file stays where it is, like a bad archive
+                print(f"Can't move {file}: {e}")
+                progress.add("errors")
+                if dedup:
+                    # its duplicates are settled against the file where it stayed
+                    dedup.targets[file] = file
+            except Exception as e:
+                failures.append(e)
+                progress.add("errors")
+
+    threads = [Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    index = 0
+    duplicates = []
+    # paths given to the moves of this run; the walk can reach a category
+    # folder after a file was moved into it
+    targets = set()
+    if profile and skip:
+        skip = profiled_skip(skip, profile)
+    for source in sources:
+        files = profile.timed(source, "scan") if profile else source
+        if dedup:
+            # sizes of the whole source are needed before the first move
+            source, files, kept = files, [], []
+            for file in source:
+                (kept if skip and skip(file) else files).append(file)
+            progress.add("scanned", len(kept))
+            progress.add("skipped", len(kept))
+            if profile:
+                hashed = dedup.hashed
+                with profile.phase("dedup", len(files)):
+                    dedup.find(files, kept)
+                profile.add("dedup", size=dedup.hashed - hashed)
+            else:
+                dedup.find(files, kept)
+        for file in files:
+            if file in targets:
+                continue
+            progress.add("scanned")
+            if not dedup and skip and skip(file):
+                progress.add("skipped")
+                continue
+            category = get_category(file)
+            if dedup and file in dedup.originals:
+                duplicates.append((index, file, category))
+            else:
+                if dedup:
+                    new_path = dedup.target(file, category, root_dir)
+                elif profile:
+                    with profile.phase("normalize", 1):
+                        new_path = root_dir.joinpath(category).joinpath(normalize(file))
+                else:
+                    new_path = root_dir.joinpath(category).joinpath(normalize(file))
+                targets.add(new_path)
+                tasks.put((index, file, category, new_path))
+            index += 1
+    for _ in threads:
+        tasks.put(None)
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise failures[0]
+    for index, file, category in duplicates:
+        progress.add("duplicates")
+        if profile:
+            with profile.phase("dedup", 1):
+                new_path = dedup.settle(file, category, root_dir)
+        else:
+            new_path = dedup.settle(file, category, root_dir)
+        if new_path:
+            if folders:
+                folders.moved(file, new_path)
+            moved.append((index, new_path, category))
+    return [(new_path, category) for _, new_path, category in sorted(moved, key=lambda item: item[0])]
+
+
+def profiled_transfer(
+    file: Path, category: str, root_dir: Path, new_path: Path, profile: SortProfile, mover: Transfer
+) -> Path:
+    start = perf_counter()
+    size = file.stat().st_size
+    new_path.parent.mkdir(exist_ok=True)
+    copied = mover.move(file, new_path)
+    profile.add("copy" if copied else "move", perf_counter() - start, 1, size, category)
+    return new_path
+
+
+def profiled_skip(skip, profile: SortProfile):
+    def inner(file: Path) -> bool:
+        with profile.phase("manifest", 1):
+            return skip(file)
+
+    return inner
+
+
+def delete_empty_folders(path: Path, profile: SortProfile = None) -> None:
+    """Remove the empty folders under path, nested ones too, listing every folder once.
+
+    sort_path prunes with the counts of its own walk instead, see EmptyFolders.
+    """
+    listed = 0
+    removed_dirs = set()
+    for directory, dirnames, filenames in os.walk(path, topdown=False):
+        listed += 1
+        if directory == str(path) or filenames:
+            continue
+        if all(os.path.join(directory, name) in removed_dirs for name in dirnames):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                continue
+            removed_dirs.add(directory)
+    if profile:
+        profile.add("prune", items=listed)
+
+
+def sort_path(
+    path: Path,
+    incremental: bool = True,
+    dedup: str = None,
+    profile: SortProfile = None,
+    output: Path = None,
+    verify: str = "size",
+) -> SortProgress:
+    """Sort path and write the reports.
+
+    A manifest is kept in path, so the next incremental run only moves new
+    or changed files and adds their lines to the reports; a full run sorts
+    everything and writes the manifest anew. dedup
+    is None, "report" or "link", see Deduplicator. A profile gets the
+    time, items and bytes of every phase.
+
+    With output, the category folders and reports are made there instead
+    of in path and every file met is moved out of path; no manifest is
+    needed then. Files going to another filesystem are copied and the
+    copies checked by verify, "size" or "hash", see Transfer.
+    """
+    start = perf_counter()
+    if output is not None:
+        if output.resolve() == path.resolve():
+            output = None
+        elif output.resolve().is_relative_to(path.resolve()):
+            raise ValueError("The output folder can't be inside the sorted folder")
+        else:
+            output.mkdir(parents=True, exist_ok=True)
+    mover = Transfer(verify)
+    root_dir = output or path
+    if CONFIG_FILE.exists():
+        load_categories(CONFIG_FILE)
+    progress = SortProgress()
+    manifest = None
+    if output is None:
+        manifest = Manifest(path, load=incremental)
+        for category in [*CATEGORIES, "other"]:
+            manifest.reports.update(report_files(path, category))
+        manifest.reports.add(path.joinpath("duplicates.txt"))
+    deduplicator = Deduplicator(dedup) if dedup else None
+    folders = EmptyFolders(path)
+    report = sort_folder_pipeline(
+        path, progress=progress, manifest=manifest, dedup=deduplicator, profile=profile,
+        folders=folders, output=output, mover=mover,
+    )
+    with profile_phase(profile, "prune"):
+        folders.prune(profile)
+    with profile_phase(profile, "report"):
+        write_in_file(report.files, report.exts, root_dir, patch=incremental)
+        if deduplicator:
+            write_duplicates(deduplicator, root_dir)
+    if manifest:
+        with profile_phase(profile, "manifest"):
+            for category in [*CATEGORIES, "other"]:
+                for file in report_files(path, category):
+                    if file.exists():
+                        manifest.add(file, category)
+            manifest.save()
+    if profile:
+        profile.wall += perf_counter() - start
+    return progress
+
+
+@contextmanager
+def profile_phase(profile: SortProfile, name: str):
+    if profile is None:
+        yield
+    else:
+        with profile.phase(name):
+            yield
 
 
 def sort_main() -> str:
@@ -113,12 +863,55 @@ def sort_main() -> str:
         if not path.exists():
             return "Path does not exists"
 
-        sort_folder(path)
-        delete_empty_folders(path)
-        write_in_file(file_list, ext_list, path)
+        print(sort_path(path))
 
         return "Folder sorted"
 
 
+def sort_cli(argv: list = None) -> None:
+    """Sort a folder from the command line, optionally into another folder or with a profile of the run."""
+    args_parser = argparse.ArgumentParser(description="Sort a folder by file categories.")
+    args_parser.add_argument("path", nargs="?", type=Path, help="folder to sort, asked for if omitted")
+    args_parser.add_argument("--full", action="store_true", help="sort everything, not only new files")
+    args_parser.add_argument("--dedup", choices=("report", "link"))
+    args_parser.add_argument("--output", type=Path, metavar="DIR",
+                             help="make the category folders here instead of in path")
+    args_parser.add_argument("--verify", choices=("size", "hash"), default="size",
+                             help="check of files copied to an output on another filesystem")
+    args_parser.add_argument("--profile", action="store_true",
+                             help="print time, items and bytes by phase and category")
+    args_parser.add_argument("--profile-output", type=Path, metavar="FILE", help="write the profile as JSON")
+    args_parser.add_argument("--pstats", type=Path, metavar="FILE",
+                             help="write a cProfile dump of the main thread")
+    args = args_parser.parse_args(argv)
+    if args.path is None:
+        print(sort_main())
+        return
+    if not args.path.is_dir():
+        print("Path does not exists")
+        return
+
+    profile = SortProfile() if args.profile or args.profile_output or args.pstats else None
+    profiler = cProfile.Profile() if args.pstats else None
+    if profiler:
+        profiler.enable()
+    try:
+        print(sort_path(
+            args.path, incremental=not args.full, dedup=args.dedup, profile=profile,
+            output=args.output, verify=args.verify,
+        ))
+    except ValueError as e:
+        print(e)
+        return
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.pstats)
+    if profile:
+        print(profile)
+        if args.profile_output:
+            args.profile_output.write_text(json.dumps(profile.as_dict(), indent=2))
+
+
 if __name__ == "__main__":
-    print(sort_main())
\ No newline at end of file
+    sort_cli()
\ No newline at end of file
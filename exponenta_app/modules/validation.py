@@ -0,0 +1,52 @@
+"""Validation of phones and emails, for one value or a whole column of them.
+
+Patterns are compiled once. A column of phones is checked with a single
+match over its joined values, only a column with bad values is checked one
+by one to find them. Emails are always matched one by one: an email only
+has to start like one, and a joined pattern that allows anything after it
+on the line backtracks across all the lines once a value is bad.
+"""
+import re
+
+PHONE_PATTERN = re.compile(r"[0-9]{10}")
+EMAIL_PATTERN = re.compile(r"[A-z.]+\w+@[A-z]+\.[A-Za-z]{2,}")
+
+PHONE_COLUMN = re.compile(r"(?:[0-9]{10}\n)*[0-9]{10}")
+
+# separators people write phones with: "(012) 345-67-89", "012.345.67.89"
+PHONE_SEPARATORS = str.maketrans("", "", " -().\t")
+
+
+def canonical_phone(phone: str) -> str:
+    """Phone as its 10 digits; ValueError if it is not a phone."""
+    digits = phone.translate(PHONE_SEPARATORS)
+    if PHONE_PATTERN.fullmatch(digits):
+        return digits
+    raise ValueError("Wrong phone format. It must contains 10 digits")
+
+
+def is_email(email: str) -> bool:
+    return EMAIL_PATTERN.match(email) is not None
+
+
+def canonical_phones(phones: list) -> tuple:
+    """(canonical phones, positions of the bad ones) for a column of phones."""
+    digits = "\n".join(phones).translate(PHONE_SEPARATORS)
+    # a value with a line break of its own would shift the split
+    if digits.count("\n") == len(phones) - 1 and PHONE_COLUMN.fullmatch(digits):
+        return digits.split("\n"), []
+    canonical, bad = [], []
+    for i, phone in enumerate(phones):
+        phone = phone.translate(PHONE_SEPARATORS)
+        if PHONE_PATTERN.fullmatch(phone):
+            canonical.append(phone)
+        else:
+            canonical.append(None)
+            bad.append(i)
+    return canonical, bad
+
+
+def bad_emails(emails: list) -> list:
+    """Positions of the values in a column of emails that are not emails."""
+    match = EMAIL_PATTERN.match
+    return [i for i, email in enumerate(emails) if not match(email)]
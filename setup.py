@@ -9,5 +9,8 @@ setup(
     license='MIT',
     packages=find_namespace_packages(),
     install_requires=['prompt-toolkit'],
-    entry_points = {'console_scripts': ['exponenta-app=exponenta_app.exponenta_main:main']}
+    entry_points = {'console_scripts': [
+        'exponenta-app=exponenta_app.exponenta_main:main',
+        'exponenta-batch=exponenta_app.modules.batch:batch_main',
+    ]}
     )
\ No newline at end of file
@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """The stores keep their files in the current directory."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,286 @@
+from datetime import date
+
+import pytest
+
+from exponenta_app.modules import address_book
+from exponenta_app.modules.address_book import AddressBook, Pager, Record, journal_file, save_file
+
+
+@pytest.fixture
+def book(monkeypatch):
+    book = AddressBook()
+    for name, phone, adress in (
+        ("Ann", "0501234567", "Kyiv Khreshchatyk 1"),
+        ("Bob", "0679876543", "lviv rynok 5"),
+        ("Annette", "0631112233", None),
+    ):
+        rec = Record(name, phone)
+        if adress:
+            rec.add_adress(adress)
+        book.add_record(rec)
+    monkeypatch.setattr(address_book, "phone_book", book)
+    return book
+
+
+def names(records) -> list:
+    return sorted(rec.name.value for rec in records)
+
+
+def test_search_by_name_phone_and_adress(book):
+    assert names(book.search("ann")) == ["Ann", "Annette"]
+    assert names(book.search("987")) == ["Bob"]
+    assert names(book.search("rynok")) == ["Bob"]
+    assert names(book.search("nothing")) == []
+
+
+def test_short_search_scans_every_record(book):
+    assert names(book.search("an")) == ["Ann", "Annette", "Bob"]
+
+
+def test_index_follows_changes(book):
+    book["Bob"].add_phone("0990000111")
+    assert names(book.search("0000111")) == ["Bob"]
+    book["Bob"].remove_phone("0990000111")
+    assert names(book.search("0000111")) == []
+    book.delete("Annette")
+    assert names(book.search("ann")) == ["Ann"]
+
+
+def test_find_command(book):
+    assert address_book.find("050123") == f"Finded \n{book['Ann']}"
+    assert address_book.find("nett") == f"Finded \n{book['Annette']}"
+    assert address_book.find("lviv") == f"Finded \n{book['Bob']}"
+    assert address_book.find("nobody") == "Nothing was found for your request."
+
+
+def test_search_command(book):
+    assert address_book.search("an") == "Search string must contain at least 3 symbols"
+    assert address_book.search("050-123") == f"Finded \n{book['Ann']}"
+    result = address_book.search("ann")
+    assert result.splitlines()[1:] == [str(book["Ann"]), str(book["Annette"])]
+
+
+def new_book() -> AddressBook:
+    book = AddressBook()
+    book.load_book()
+    return book
+
+
+def test_torn_journal_tail_is_dropped_on_load():
+    book = new_book()
+    book.add_record(Record("Ann", "0501234567"))
+    book.commit()
+    good_size = journal_file.stat().st_size
+    book.add_record(Record("Bob", "0501234568"))
+    book.commit()
+    # a crash in the middle of the second entry
+    with open(journal_file, "r+b") as file:
+        file.truncate(journal_file.stat().st_size - 5)
+
+    book = new_book()
+    assert list(book) == ["Ann"]
+    assert journal_file.stat().st_size == good_size
+
+    book.add_record(Record("Cid", "0501234569"))
+    book.commit()
+    assert sorted(new_book()) == ["Ann", "Cid"]
+
+
+def test_journal_replays_changes_and_deletions():
+    book = new_book()
+    book.add_record(Record("Ann", "0501234567"))
+    book.add_record(Record("Bob", "0501234568"))
+    book.commit()
+    book["Ann"].add_phone("0501111111")
+    book.delete("Bob")
+    book.commit()
+    assert not save_file.exists()
+
+    loaded = new_book()
+    assert list(loaded) == ["Ann"]
+    assert [p.phone for p in loaded["Ann"].phones] == ["0501234567", "0501111111"]
+
+
+def test_compaction_writes_snapshot_and_drops_journal():
+    book = new_book()
+    book.add_record(Record("Ann", "0501234567"))
+    book.commit()
+    book.add_record(Record("Bob", "0501234568"))
+    book.compact()
+    assert save_file.exists() and not journal_file.exists()
+    assert sorted(new_book()) == ["Ann", "Bob"]
+
+
+@pytest.fixture
+def birthdays(monkeypatch):
+    book = AddressBook()
+    for name, birthday in (
+        ("Ann", date(1990, 3, 1)),
+        ("Bob", date(1992, 2, 29)),
+        ("Cid", date(1985, 12, 31)),
+        ("Dan", None),
+    ):
+        rec = Record(name, "0501234567")
+        if birthday:
+            rec.add_birthday(birthday)
+        book.add_record(rec)
+    monkeypatch.setattr(address_book, "phone_book", book)
+    return book
+
+
+def upcoming(book, days: int, today: date) -> list:
+    return [(offset, rec.name.value) for offset, rec in book.upcoming_birthdays(days, today)]
+
+
+def test_birthday_window_counts_from_today(birthdays):
+    assert upcoming(birthdays, 0, date(2023, 3, 1)) == [(0, "Ann")]
+    assert upcoming(birthdays, 10, date(2023, 12, 25)) == [(6, "Cid")]
+    # the window wraps into the next year
+    assert upcoming(birthdays, 70, date(2023, 12, 25)) == [(6, "Cid"), (66, "Bob"), (67, "Ann")]
+
+
+def test_feb_29_birthday_falls_on_feb_28_in_common_years(birthdays):
+    assert upcoming(birthdays, 1, date(2023, 2, 27)) == [(1, "Bob")]
+    assert upcoming(birthdays, 2, date(2024, 2, 27)) == [(2, "Bob")]
+    assert upcoming(birthdays, 1, date(2024, 2, 28)) == [(1, "Bob")]
+    assert birthdays["Bob"].days_to_birthday(date(2023, 2, 1)) == 27
+    assert birthdays["Bob"].days_to_birthday(date(2024, 2, 1)) == 28
+    assert birthdays["Bob"].days_to_birthday(date(2023, 3, 1)) == 365
+
+
+def test_birthday_index_follows_changes(birthdays):
+    birthdays["Dan"].add_birthday(date(2000, 3, 2))
+    assert upcoming(birthdays, 1, date(2023, 3, 1)) == [(0, "Ann"), (1, "Dan")]
+    birthdays.delete("Ann")
+    assert upcoming(birthdays, 1, date(2023, 3, 1)) == [(1, "Dan")]
+
+
+def test_birthday_in_command(birthdays):
+    assert address_book.birthday_in("x") == "Wrong format. Try again"
+    assert address_book.birthday_in("366").startswith("Our birthday people in 366 days\n")
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    book = AddressBook()
+    for name in ("Eve", "Ann", "Dan", "Bob", "Fay", "Cid", "Gus"):
+        book.add_record(Record(name, "0501234567"))
+    monkeypatch.setattr(address_book, "phone_book", book)
+    return book
+
+
+def page_names(page: list) -> list:
+    return [line.split(",")[0].removeprefix("Contact name: ") for line in page]
+
+
+def test_pages_follow_name_order(pages):
+    assert [page_names(page) for page in pages.iterator(3)] == [
+        ["Ann", "Bob", "Cid"], ["Dan", "Eve", "Fay"], ["Gus"],
+    ]
+
+
+def test_pager_seeks_by_page_and_name(pages):
+    pager = Pager(pages, 3)
+    pager.seek_page(2)
+    assert pager.page_number() == 2
+    assert page_names(pager.next_page()) == ["Dan", "Eve", "Fay"]
+    pager.seek_name("Cx")
+    assert page_names(pager.next_page()) == ["Dan", "Eve", "Fay"]
+    assert page_names(pager.next_page()) == ["Gus"]
+    assert pager.next_page() == []
+    pager.seek_page(4)
+    assert pager.start is None and pager.next_page() == []
+
+
+def test_pager_cursor_survives_changes(pages):
+    pager = Pager(pages, 3)
+    assert page_names(pager.next_page()) == ["Ann", "Bob", "Cid"]
+    pages.delete("Ann")
+    pages.add_record(Record("Abe", "0501234567"))
+    pages.add_record(Record("Dee", "0501234567"))
+    assert page_names(pager.next_page()) == ["Dan", "Dee", "Eve"]
+
+
+def test_show_all_command(pages, monkeypatch, capsys):
+    monkeypatch.setattr(address_book, "interactive", False)
+    assert address_book.show_all("3", "page", "9") == "There are no records on this page"
+    address_book.show_all("3", "from", "E")
+    assert page_names(capsys.readouterr().out.splitlines()) == ["Eve", "Fay", "Gus"]
+
+    # q stops after the first page
+    monkeypatch.setattr(address_book, "interactive", True)
+    monkeypatch.setattr("builtins.input", lambda prompt: "q")
+    address_book.show_all("2")
+    assert page_names(capsys.readouterr().out.splitlines()) == ["Ann", "Bob"]
+
+
+def test_two_sessions_merge_their_records():
+    first, second = new_book(), new_book()
+    first.add_record(Record("Ann", "0501234567"))
+    assert first.commit() == []
+    second.add_record(Record("Bob", "0501234568"))
+    assert second.commit() == []
+
+    assert sorted(second) == ["Ann", "Bob"]
+    first.commit()
+    assert sorted(first) == ["Ann", "Bob"]
+    assert sorted(new_book()) == ["Ann", "Bob"]
+
+
+def test_record_changed_in_both_sessions_is_a_conflict():
+    first = new_book()
+    first.add_record(Record("Ann", "0501234567"))
+    first.commit()
+    second = new_book()
+
+    first["Ann"].add_phone("0501111111")
+    assert first.commit() == []
+    second["Ann"].add_phone("0502222222")
+    assert second.commit() == ["Ann"]
+
+    # the version committed first is kept everywhere
+    phones = ["0501234567", "0501111111"]
+    assert [p.phone for p in second["Ann"].phones] == phones
+    assert [p.phone for p in new_book()["Ann"].phones] == phones
+
+
+def test_record_deleted_in_both_sessions_is_no_conflict():
+    first = new_book()
+    first.add_record(Record("Ann", "0501234567"))
+    first.commit()
+    second = new_book()
+    first.delete("Ann")
+    first.commit()
+    second.delete("Ann")
+    assert second.commit() == []
+    assert list(new_book()) == []
+
+
+def test_compaction_in_another_session_keeps_records():
+    first, second = new_book(), new_book()
+    first.add_record(Record("Ann", "0501234567"))
+    first.add_record(Record("Cid", "0501234569"))
+    first.commit()
+    second.commit()
+    second.add_record(Record("Bob", "0501234568"))
+    second.delete("Cid")
+    second.compact()
+
+    assert not journal_file.exists()
+    assert first.commit() == []
+    assert sorted(first) == ["Ann", "Bob"]
+    assert sorted(new_book()) == ["Ann", "Bob"]
+
+
+def test_record_added_again_after_another_session_compacted():
+    first, second = new_book(), new_book()
+    first.add_record(Record("Bob", "0501234568"))
+    first.commit()
+    first.delete("Bob")
+    first.commit()
+    second.compact()
+
+    first.add_record(Record("Bob", "0509999999"))
+    assert first.commit() == []
+    assert [p.phone for p in first["Bob"].phones] == ["0509999999"]
+    assert [p.phone for p in new_book()["Bob"].phones] == ["0509999999"]
@@ -0,0 +1,103 @@
+from datetime import date
+
+import pytest
+
+from exponenta_app.modules.address_book import AddressBook, Record
+from exponenta_app.modules.address_io import export_file, import_file, parse_birthday
+
+
+def write(path, text: str):
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def test_csv_import_reports_bad_rows(workdir):
+    book = AddressBook()
+    book.add_record(Record("Old", "0500000000"))
+    csv_file = write(workdir / "contacts.csv", "\n".join([
+        "name,phones,birthday,email,adress",
+        "Ann,050-123-45-67;(067) 111 2233,29/02/1992,ann@mail.com,Kyiv",
+        ",0501234567,,,",
+        "Bob,12345,,,",
+        "Cid,0501234567,,not an email,",
+        "Dan,0501234567,31/02/1990,,",
+        "Old,0501234567,,,",
+        "Ann,0501234567,,,",
+        "Eve,0501234567,1990-05-01,,",
+    ]) + "\n")
+
+    result = import_file(book, csv_file)
+    assert result.imported == 2
+    assert result.errors == [
+        (3, "empty name"),
+        (4, "wrong phone 12345, it must contain 10 digits"),
+        (5, "wrong email not an email"),
+        (6, "wrong birthday 31/02/1990"),
+        (7, "contact Old already exists"),
+        (8, "contact Ann already exists"),
+    ]
+    assert str(result).startswith("Imported 2 contacts, 6 rows with errors\nrow 3: empty name")
+    ann = book["Ann"]
+    assert [p.phone for p in ann.phones] == ["0501234567", "0671112233"]
+    assert (ann.birthday, str(ann.email), str(ann.adress)) == (date(1992, 2, 29), "ann@mail.com", "Kyiv")
+    assert book["Eve"].birthday == date(1990, 5, 1)
+
+
+def test_vcard_import_reports_bad_cards(workdir):
+    book = AddressBook()
+    vcard = write(workdir / "contacts.vcf", "\r\n".join([
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        "FN:Ann\\, the first",
+        "TEL;TYPE=CELL:050 123 45 67",
+        "EMAIL:ann@mail.com",
+        "BDAY:1990-03-01",
+        "ADR:;;Khreshchatyk 1;Ky",
+        " iv;;;",
+        "END:VCARD",
+        "BEGIN:VCARD",
+        "FN:Bob",
+        "TEL:123",
+        "END:VCARD",
+        "BEGIN:VCARD",
+        "FN:Cid",
+        "BDAY:tomorrow",
+        "END:VCARD",
+    ]) + "\r\n")
+
+    result = import_file(book, vcard)
+    assert result.imported == 1
+    # cards are numbered by their BEGIN line, counting folded lines once
+    assert result.errors == [(9, "wrong phone 123, it must contain 10 digits"), (13, "wrong birthday tomorrow")]
+    ann = book["Ann, the first"]
+    assert [p.phone for p in ann.phones] == ["0501234567"]
+    assert str(ann.adress) == "Khreshchatyk 1, Kyiv"
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".vcf"])
+def test_export_and_import_round_trip(workdir, suffix):
+    book = AddressBook()
+    ann = Record("Ann", "0501234567", email="ann@mail.com")
+    ann.add_phone("0671112233")
+    ann.add_birthday(date(1992, 2, 29))
+    ann.add_adress("Kyiv; Khreshchatyk, 1")
+    book.add_record(ann)
+    book.add_record(Record("Bob"))
+    path = workdir / f"contacts{suffix}"
+    assert export_file(book, path) == 2
+
+    copy = AddressBook()
+    result = import_file(copy, path)
+    assert (result.imported, result.errors) == (2, [])
+    assert [str(rec) for rec in copy.values()] == [str(rec) for rec in book.values()]
+
+
+def test_unknown_file_type(workdir):
+    with pytest.raises(ValueError):
+        import_file(AddressBook(), write(workdir / "contacts.txt", ""))
+
+
+def test_birthday_formats():
+    assert parse_birthday("01/03/1990") == parse_birthday("1990-03-01") == parse_birthday("19900301")
+    with pytest.raises(ValueError):
+        parse_birthday("1/3/90")
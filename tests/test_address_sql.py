@@ -0,0 +1,86 @@
+from datetime import date
+
+import pytest
+
+from exponenta_app.modules.address_book import AddressBook, Pager, Record
+from exponenta_app.modules.address_sql import SqliteAddressBook
+
+
+def fill(book):
+    for name, phone, adress, birthday in (
+        ("Ann", "0501234567", "Kyiv Khreshchatyk 1", date(1992, 2, 29)),
+        ("Bob", "0679876543", "Lviv Rynok 5", date(1990, 3, 1)),
+        ("Annette", "0631112233", None, None),
+    ):
+        rec = Record(name, phone)
+        if adress:
+            rec.add_adress(adress)
+        if birthday:
+            rec.add_birthday(birthday)
+        book.add_record(rec)
+    return book
+
+
+@pytest.fixture
+def book():
+    book = fill(SqliteAddressBook())
+    book.commit()
+    return book
+
+
+def names(records) -> list:
+    return [rec.name.value for rec in records]
+
+
+@pytest.mark.parametrize("search", ["ann", "987", "050-123", "rynok", "kyiv", "nothing"])
+def test_search_matches_the_memory_book(book, search):
+    memory = fill(AddressBook())
+    assert names(book.search(search)) == sorted(names(memory.search(search)))
+    assert names(book.search(search, phones=False)) == sorted(names(memory.search(search, phones=False)))
+
+
+def test_short_search_scans_the_tables(book):
+    # AddressBook returns every record then and leaves the filtering to find
+    assert names(book.search("An")) == ["Ann", "Annette"]
+    assert names(book.search("98")) == ["Bob"]
+
+
+def test_search_index_follows_changes(book):
+    book["Bob"].add_phone("0990000111")
+    assert names(book.search("0000111")) == ["Bob"]
+    book.delete("Annette")
+    assert names(book.search("ann")) == ["Ann"]
+    book.add_record(Record("Joanna", "0661234567"))
+    assert names(book.search("ann")) == ["Ann", "Joanna"]
+
+
+def test_search_index_is_filled_for_older_databases(book):
+    book.db.execute("DROP TABLE contacts_search")
+    book.commit()
+    assert names(SqliteAddressBook().search("rynok")) == ["Bob"]
+
+
+def test_birthdays_and_pages(book):
+    upcoming = [(days, rec.name.value) for days, rec in book.upcoming_birthdays(2, date(2023, 2, 27))]
+    assert upcoming == [(1, "Ann"), (2, "Bob")]
+    pager = Pager(book, 2)
+    pager.seek_page(2)
+    assert [line.split(",")[0] for line in pager.next_page()] == ["Contact name: Bob"]
+
+
+def test_change_in_another_session_is_a_conflict(book):
+    other = SqliteAddressBook()
+    first, second = book["Ann"], other["Ann"]
+    first.add_phone("0501111111")
+    assert book.commit() == []
+    second.add_phone("0502222222")
+    assert other.commit() == ["Ann"]
+    assert [p.phone for p in SqliteAddressBook()["Ann"].phones] == ["0501234567", "0501111111"]
+
+
+def test_pickled_book_is_migrated(workdir):
+    pickled = fill(AddressBook())
+    pickled.commit()
+    book = SqliteAddressBook()
+    assert book.load_book() == "Phonebook migrated to phone_book.db, 3 records"
+    assert [str(rec) for rec in book.values()] == [str(pickled[name]) for name in sorted(pickled)]
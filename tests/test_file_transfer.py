@@ -0,0 +1,105 @@
+import errno
+import os
+
+import pytest
+
+from exponenta_app.modules.file_transfer import Transfer, TransferError
+
+
+@pytest.fixture
+def source(workdir):
+    path = workdir / "source.bin"
+    path.write_bytes(os.urandom(3 << 20))
+    os.utime(path, (1_000_000_000, 1_000_000_000))
+    return path
+
+
+def test_copy_file_keeps_data_and_times(workdir, source):
+    target = workdir / "target.bin"
+    Transfer("hash").copy_file(source, target)
+    assert target.read_bytes() == source.read_bytes()
+    assert target.stat().st_mtime == source.stat().st_mtime
+    assert not (workdir / ".target.bin.part").exists()
+
+
+def test_short_copy_is_refused(workdir, source, monkeypatch):
+    transfer = Transfer()
+    monkeypatch.setattr(transfer, "copy_data", lambda src, dst, size: size - 1)
+    with pytest.raises(TransferError):
+        transfer.copy_file(source, workdir / "target.bin")
+    assert list(workdir.iterdir()) == [source]
+
+
+def test_hash_verify_finds_changed_bytes(workdir, source, monkeypatch):
+    def corrupt(src, dst, size):
+        os.write(dst, bytes(size))
+        return size
+
+    transfer = Transfer("hash")
+    monkeypatch.setattr(transfer, "copy_data", corrupt)
+    with pytest.raises(TransferError):
+        transfer.copy_file(source, workdir / "target.bin")
+    assert list(workdir.iterdir()) == [source]
+
+
+def test_move_to_another_device_copies_then_removes_source(workdir, source, monkeypatch):
+    data = source.read_bytes()
+    (workdir / "other").mkdir()
+    target = workdir / "other" / "target.bin"
+    target.write_bytes(b"old")
+    transfer = Transfer()
+    monkeypatch.setattr(transfer, "device", lambda path: os.path.dirname(path))
+
+    assert transfer.move(source, target) is True
+    assert target.read_bytes() == data
+    assert not source.exists()
+
+
+def test_failed_copy_keeps_source(workdir, source, monkeypatch):
+    (workdir / "other").mkdir()
+    transfer = Transfer()
+    monkeypatch.setattr(transfer, "device", lambda path: os.path.dirname(path))
+    monkeypatch.setattr(transfer, "copy_data", lambda src, dst, size: 0)
+    with pytest.raises(TransferError):
+        transfer.move(source, workdir / "other" / "target.bin")
+    assert source.exists()
+    assert list((workdir / "other").iterdir()) == []
+
+
+def test_symlink_replaces_target_across_devices(workdir, monkeypatch):
+    link = workdir / "link"
+    link.symlink_to("/etc/hostname")
+    (workdir / "other").mkdir()
+    target = workdir / "other" / "link"
+    target.write_text("old")
+    transfer = Transfer()
+    monkeypatch.setattr(transfer, "device", lambda path: os.path.dirname(path))
+
+    transfer.move(link, target)
+    assert os.readlink(target) == "/etc/hostname"
+    assert not os.path.lexists(link)
+
+
+def test_same_device_move_is_a_rename(workdir, source):
+    inode = source.stat().st_ino
+    target = workdir / "target.bin"
+    assert Transfer().move(source, target) is False
+    assert target.stat().st_ino == inode
+
+
+def test_unsupported_copier_is_dropped(workdir, source):
+    def unsupported(src, dst, size):
+        os.write(dst, b"partial")
+        raise OSError(errno.ENOSYS, "Function not implemented")
+
+    transfer = Transfer("hash")
+    transfer.copiers = [unsupported]
+    target = workdir / "target.bin"
+    transfer.copy_file(source, target)
+    assert target.read_bytes() == source.read_bytes()
+    assert transfer.copiers == []
+
+
+def test_unknown_verify_mode():
+    with pytest.raises(ValueError):
+        Transfer("mtime")
@@ -0,0 +1,174 @@
+import re
+
+import pytest
+
+from exponenta_app.modules.note import CONFLICT_MESSAGE, NoteBook, NoteIndex, NoteStore, index_file
+from exponenta_app.modules.note_sql import SqliteNoteBook
+
+
+def shown(capsys) -> list:
+    """Ids of the notes printed since the last call."""
+    return [int(i) for i in re.findall(r"^Note: (\d+),", capsys.readouterr().out, re.M)]
+
+
+@pytest.fixture
+def notebook(capsys):
+    notebook = NoteBook()
+    notebook.add_note("buy milk and bread #shop #food")
+    notebook.add_note("milk milk milk for the cat #cat")
+    notebook.add_note("call mom #family #food")
+    capsys.readouterr()
+    return notebook
+
+
+def test_word_search_ranks_by_score(notebook, capsys):
+    notebook.search_notes("milk")
+    assert shown(capsys) == [1, 0]
+    notebook.search_notes("bread mom")
+    assert sorted(shown(capsys)) == [0, 2]
+
+
+def test_word_search_falls_back_to_substrings(notebook, capsys):
+    notebook.search_notes("brea")
+    assert shown(capsys) == [0]
+    notebook.search_notes("nothing")
+    assert "There are no records matching your search query" in capsys.readouterr().out
+
+
+def test_tag_search_all_and_any(notebook, capsys):
+    notebook.search_tags(["#food", "shop"])
+    assert shown(capsys) == [0]
+    notebook.search_tags(["FOOD"])
+    assert shown(capsys) == [0, 2]
+    notebook.search_tags(["cat", "family"], match_all=False)
+    assert shown(capsys) == [1, 2]
+
+
+def test_index_follows_changes(notebook, capsys):
+    notebook.search_tags(["food"])
+    capsys.readouterr()
+    notebook.change_note(0, "buy cheese #shop")
+    notebook.delete_note(2)
+    capsys.readouterr()
+    notebook.search_tags(["food"])
+    assert shown(capsys) == []
+    notebook.search_notes("cheese")
+    assert shown(capsys) == [0]
+    notebook.search_notes("milk")
+    assert shown(capsys) == [1]
+
+
+def test_index_picks_up_other_sessions(notebook, capsys):
+    notebook.search_notes("milk")
+    other = NoteBook()
+    other.add_note("oat milk #shop")
+    capsys.readouterr()
+    notebook.search_tags(["shop"])
+    assert shown(capsys) == [0, 3]
+
+
+def test_note_index_removes_empty_postings():
+    index = NoteIndex()
+    note = {"id": 7, "text": "Hello, hello world", "tags": ["Greeting"]}
+    index.add(note)
+    assert index.words["hello"] == {7: 2}
+    assert index.search_tags(["#greeting"]) == {7}
+    index.remove(note)
+    assert not index.words and not index.tags
+
+
+@pytest.mark.parametrize("open_notebook", [NoteBook, SqliteNoteBook])
+def test_ids_stay_with_their_notes(open_notebook, capsys):
+    notebook = open_notebook()
+    for text in ("zero", "one", "two"):
+        notebook.add_note(text)
+    notebook.delete_note(1)
+    notebook.change_note(2, "two changed")
+    notebook.save_notes()
+
+    notebook = open_notebook()
+    assert notebook[2]["text"] == "two changed"
+    assert 1 not in notebook
+
+
+@pytest.mark.parametrize("open_notebook", [NoteBook, SqliteNoteBook])
+def test_ids_are_not_reused(open_notebook, capsys):
+    notebook = open_notebook()
+    notebook.add_note("zero")
+    notebook.add_note("one")
+    notebook.delete_note(1)
+    notebook.save_notes()
+
+    notebook = open_notebook()
+    notebook.add_note("two")
+    capsys.readouterr()
+    notebook.display_all_notes()
+    assert shown(capsys) == [0, 2]
+
+
+def test_store_reads_bodies_only_on_access(notebook):
+    store = NoteStore()
+    with store.locked():
+        locations = store.open()
+    assert list(locations) == [0, 1, 2]
+    assert store.map is None
+    assert store.read(*locations[1])["text"] == "milk milk milk for the cat #cat"
+    store.close()
+
+
+def test_torn_index_entry_is_dropped(notebook):
+    notebook.store.close()
+    with open(index_file, "ab") as file:
+        file.write(b"\x01\x02\x03")
+    reopened = NoteBook()
+    assert list(reopened.data) == [0, 1, 2]
+    assert (index_file.stat().st_size - NoteStore.header.size) % NoteStore.entry.size == 0
+
+
+def test_save_compacts_when_most_of_the_bodies_are_old(notebook, capsys):
+    for i in range(4):
+        notebook.change_note(1, f"version {i} #cat")
+    old_body = notebook.store.body_path
+    notebook.save_notes()
+    assert not old_body.exists()
+    assert notebook.store.size == sum(length for _, length in notebook.data.values())
+    assert NoteBook()[1]["text"] == "version 3 #cat"
+
+
+def test_compaction_while_another_session_is_open(capsys):
+    first = NoteBook()
+    for i in range(6):
+        first.add_note(f"note {i} #tag")
+    second = NoteBook()
+    second.display_all_notes()
+    old_body = second.store.body_path
+    for i in range(5):
+        first.delete_note(i)
+    first.save_notes()
+    assert not old_body.exists()
+
+    # the second session still maps the old bodies and has the old index
+    second.change_note(5, "changed #new")
+    assert list(second.data) == [5]
+    assert NoteBook()[5]["text"] == "changed #new"
+    first.search_tags(["new"])
+    assert shown(capsys)[-1:] == [5]
+
+
+def test_stale_session_cannot_overwrite(capsys):
+    first = NoteBook()
+    first.add_note("first text")
+    second = NoteBook()
+    second.display_all_notes()
+    first.change_note(0, "changed in first")
+    capsys.readouterr()
+
+    second.change_note(0, "changed in second")
+    second.delete_note(0)
+    assert capsys.readouterr().out == CONFLICT_MESSAGE.format(0) + "\n" + CONFLICT_MESSAGE.format(0) + "\n"
+    assert NoteBook()[0]["text"] == "changed in first"
+
+    # once shown again, the note can be changed
+    second.display_all_notes()
+    second.change_note(0, "changed in second")
+    assert NoteBook()[0]["text"] == "changed in second"
@@ -0,0 +1,62 @@
+import re
+
+import pytest
+
+from exponenta_app.modules.note import NoteBook
+from exponenta_app.modules.note_sql import SqliteNoteBook
+
+
+def shown(capsys) -> list:
+    return [int(i) for i in re.findall(r"^Note: (\d+),", capsys.readouterr().out, re.M)]
+
+
+def fill(notebook):
+    notebook.add_note("buy milk and bread #shop #food")
+    notebook.add_note("milk milk milk for the cat #cat")
+    notebook.add_note("call mom #family #food")
+    return notebook
+
+
+@pytest.fixture
+def notebook(capsys):
+    notebook = fill(SqliteNoteBook())
+    capsys.readouterr()
+    return notebook
+
+
+def test_searches(notebook, capsys):
+    notebook.search_notes("milk")
+    assert shown(capsys) == [1, 0]
+    notebook.search_notes("brea")
+    assert shown(capsys) == [0]
+    notebook.search_tags(["#food", "SHOP"])
+    assert shown(capsys) == [0]
+    notebook.search_tags(["cat", "family"], match_all=False)
+    assert shown(capsys) == [1, 2]
+
+
+def test_changes_reach_the_indexes(notebook, capsys):
+    notebook.change_note(0, "buy cheese #shop")
+    notebook.delete_note(2)
+    capsys.readouterr()
+    notebook.search_tags(["food"])
+    assert shown(capsys) == []
+    notebook.search_notes("cheese")
+    assert shown(capsys) == [0]
+
+
+def test_sort_by_tags(notebook, capsys):
+    notebook.sort_notes_by_tags()
+    notebook.display_all_notes()
+    assert shown(capsys) == [1, 0, 2]
+
+
+def test_file_notebook_is_migrated(capsys):
+    fill(NoteBook()).delete_note(1)
+    notebook = SqliteNoteBook()
+    capsys.readouterr()
+    notebook.display_all_notes()
+    assert shown(capsys) == [0, 2]
+    notebook.add_note("new")
+    notebook.display_all_notes()
+    assert shown(capsys) == [0, 2, 3]
@@ -0,0 +1,213 @@
+import os
+from pathlib import Path
+from random import Random
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pytest
+
+from exponenta_app.modules.sort_folders import (
+    ArchiveError, Deduplicator, Manifest, SortProgress, delete_empty_folders, move_files, sort_path,
+    unpack_archive,
+)
+
+
+def make_tree(root: Path, files: dict) -> Path:
+    for name, data in files.items():
+        file = root.joinpath(name)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_bytes(data)
+    return root
+
+
+def listing(root: Path) -> list:
+    return sorted(p.relative_to(root).as_posix() for p in root.rglob("*") if p.is_file())
+
+
+@pytest.fixture
+def tree(workdir):
+    return make_tree(workdir / "tree", {
+        "a/song.mp3": b"mp3",
+        "a/b/photo.png": b"png",
+        "notes.txt": b"txt",
+        "misc.bin": b"bin",
+    })
+
+
+def test_sort_moves_files_into_categories(tree):
+    progress = sort_path(tree)
+    assert (progress.scanned, progress.moved, progress.errors) == (4, 4, 0)
+    assert listing(tree) == [
+        Manifest.file_name,
+        "audio/audio.txt", "audio/audio_ext.txt", "audio/song.mp3",
+        "docs/docs.txt", "docs/docs_ext.txt", "docs/notes.txt",
+        "images/images.txt", "images/images_ext.txt", "images/photo.png",
+        "other/misc.bin", "other/other.txt", "other/other_ext.txt",
+    ]
+
+
+def test_walk_skips_files_it_moved_itself(workdir):
+    tree = make_tree(workdir / "tree", {"new/readme.txt": b"new"})
+    # the walk reaching docs/ once readme.txt was moved there
+    walk = iter([tree / "new" / "readme.txt", tree / "docs" / "readme.txt"])
+    progress = SortProgress()
+    moved = move_files([walk], tree, 2, 10, progress)
+    assert moved == [(tree / "docs" / "readme.txt", "docs")]
+    assert (progress.scanned, progress.moved) == (1, 1)
+
+
+def test_incremental_sort_only_moves_new_and_changed_files(tree):
+    sort_path(tree)
+    progress = sort_path(tree)
+    # the reports are skipped as well
+    assert (progress.moved, progress.skipped) == (0, progress.scanned)
+
+    make_tree(tree, {"new/readme.txt": b"new", "docs/notes.txt": b"changed"})
+    progress = sort_path(tree)
+    assert (progress.moved, progress.skipped) == (2, progress.scanned - 2)
+    assert (tree / "docs" / "docs.txt").read_text().splitlines() == ["notes.txt", "readme.txt"]
+    assert (tree / "docs" / "notes.txt").read_bytes() == b"changed"
+    assert not (tree / "new").exists()
+
+
+def test_full_sort_moves_everything_again(tree):
+    sort_path(tree)
+    (tree / "docs" / "notes.txt").unlink()
+    progress = sort_path(tree, incremental=False)
+    assert progress.moved == 3
+    # the manifest no longer lists the removed file
+    assert "docs/notes.txt" not in Manifest(tree).entries
+    assert (tree / "docs" / "docs.txt").exists()
+
+
+@pytest.fixture
+def twins(workdir):
+    # same size and first block, different tail
+    block = bytes(Deduplicator.block_size)
+    return make_tree(workdir / "tree", {
+        "a/x.txt": b"same",
+        "y.txt": b"same",
+        "big1.bin": block + b"1",
+        "big2.bin": block + b"2",
+        "big3.bin": block + b"1",
+    })
+
+
+def test_duplicates_are_reported_and_left_in_place(twins):
+    progress = sort_path(twins, dedup="report")
+    assert progress.duplicates == 2
+    # one copy of each pair is sorted, the other stays where it was
+    assert [(twins / name).exists() for name in ("a/x.txt", "y.txt")].count(True) == 1
+    assert [(twins / name).exists() for name in ("big1.bin", "big3.bin")].count(True) == 1
+    assert (twins / "other" / "big2.bin").exists()
+    assert len((twins / "duplicates.txt").read_text().splitlines()) == 2
+
+
+def test_duplicates_are_linked_to_the_first_copy(twins):
+    sort_path(twins, dedup="link")
+    assert (twins / "docs" / "x.txt").stat().st_nlink == 2
+    assert os.path.samefile(twins / "other" / "big1.bin", twins / "other" / "big3.bin")
+    assert (twins / "other" / "big2.bin").stat().st_nlink == 1
+    assert not (twins / "a").exists()
+
+
+def test_duplicate_is_kept_when_linking_fails(twins, monkeypatch):
+    def no_links(*args):
+        raise PermissionError(1, "Operation not permitted")
+
+    monkeypatch.setattr(os, "link", no_links)
+    sort_path(twins, dedup="link")
+    files = listing(twins)
+    # one copy was moved, the other stayed and is reported
+    kept = "a/x.txt" if "a/x.txt" in files else "y.txt"
+    assert kept in (twins / "duplicates.txt").read_text()
+    assert not [f for f in files if f.endswith(".link")]
+
+
+def test_unknown_dedup_mode():
+    with pytest.raises(ValueError):
+        Deduplicator("move")
+
+
+def test_zip_bomb_stops_at_member_limit(workdir):
+    archive = workdir / "bomb.zip"
+    with ZipFile(archive, "w", ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("small.txt", b"ok")
+        zip_file.writestr("zeros.bin", bytes(1 << 20))
+    assert archive.stat().st_size < 1 << 14
+
+    with pytest.raises(ArchiveError):
+        unpack_archive(workdir, archive, max_member=1 << 16)
+    # the part unpacked before the limit is removed
+    assert not (workdir / "bomb").exists()
+
+
+def test_archive_within_limits_is_unpacked(workdir):
+    archive = workdir / "docs.zip"
+    with ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("a/b.txt", b"text")
+        zip_file.writestr("../evil.txt", b"outside")
+    assert unpack_archive(workdir, archive) == [workdir / "docs" / "a" / "b.txt"]
+    assert not (workdir / "evil.txt").exists()
+
+
+def damaged_zip(path: Path) -> Path:
+    with ZipFile(path, "w", ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("a.txt", Random(0).randbytes(1 << 12) * 4)
+    data = bytearray(path.read_bytes())
+    # inside the deflate stream of the member, zlib fails on it
+    data[100:120] = bytes(20)
+    path.write_bytes(data)
+    return path
+
+
+def encrypted_zip(path: Path) -> Path:
+    with ZipFile(path, "w") as zip_file:
+        zip_file.writestr("a.txt", b"secret")
+    data = bytearray(path.read_bytes())
+    # the encrypted flag of the local and central headers
+    for signature, offset in ((b"PK\x03\x04", 6), (b"PK\x01\x02", 8)):
+        data[data.find(signature) + offset] |= 1
+    path.write_bytes(data)
+    return path
+
+
+@pytest.mark.parametrize("make_archive", [damaged_zip, encrypted_zip])
+def test_unreadable_archive_is_an_archive_error(workdir, make_archive):
+    with pytest.raises(ArchiveError):
+        unpack_archive(workdir, make_archive(workdir / "bad.zip"))
+    assert not (workdir / "bad").exists()
+
+
+def test_damaged_archive_does_not_stop_the_sort(tree, capsys):
+    damaged_zip(tree / "bad.zip")
+    progress = sort_path(tree)
+    assert (progress.moved, progress.errors) == (5, 1)
+    assert "Can't unpack bad.zip" in capsys.readouterr().out
+    assert listing(tree / "archives") == ["archives.txt", "archives_ext.txt", "bad.zip"]
+    assert Manifest(tree).entries
+
+
+def folders(root: Path) -> list:
+    return sorted(p.relative_to(root).as_posix() for p in root.rglob("*") if p.is_dir())
+
+
+def test_delete_empty_folders_removes_nested_ones(workdir):
+    root = make_tree(workdir / "tree", {"keep/a/file.txt": b"x"})
+    for name in ("empty", "nested/deeper/deepest", "keep/b"):
+        root.joinpath(name).mkdir(parents=True)
+    delete_empty_folders(root)
+    assert folders(root) == ["keep", "keep/a"]
+    delete_empty_folders(root / "keep" / "a")
+    assert (root / "keep" / "a").exists()
+
+
+def test_sort_prunes_the_folders_it_emptied(tree):
+    (tree / "empty" / "nested").mkdir(parents=True)
+    with ZipFile(tree / "pack.zip", "w") as zip_file:
+        zip_file.writestr("inner/deep/tune.mp3", b"mp3")
+    progress = sort_path(tree)
+    assert (progress.extracted, progress.errors) == (1, 0)
+    assert folders(tree) == ["archives", "audio", "docs", "images", "other"]
+    # the unpacked folder is emptied by the sort too
+    assert listing(tree / "audio") == ["audio.txt", "audio_ext.txt", "song.mp3", "tune.mp3"]
+    assert listing(tree / "archives") == ["archives.txt", "archives_ext.txt", "pack.zip"]
@@ -0,0 +1,38 @@
+import time
+
+from exponenta_app.modules.address_book import AddressBook
+from exponenta_app.modules.address_io import import_file
+from exponenta_app.modules.validation import bad_emails, canonical_phone, canonical_phones
+
+
+def test_phone_column():
+    assert canonical_phones(["0501234567", "(067) 111-22-33"]) == (["0501234567", "0671112233"], [])
+    assert canonical_phones(["0501234567", "12345", "067.111.22.33", "05012345678"]) == (
+        ["0501234567", None, "0671112233", None], [1, 3],
+    )
+    # a line break inside a value must not split it into two phones
+    assert canonical_phones(["05012\n34567"]) == ([None], [0])
+    assert canonical_phone("050 123 45 67") == "0501234567"
+
+
+def test_email_column():
+    assert bad_emails([]) == []
+    assert bad_emails(["ann@mail.com", "bob.b@mail.com.ua trailing"]) == []
+    assert bad_emails(["ann@mail.com", "ann", "@mail.com", "bob@mail"]) == [1, 2, 3]
+
+
+def test_bad_email_after_many_good_ones_is_found_quickly():
+    emails = [f"user{i}@mail.com" for i in range(10000)] + ["not an email"]
+    start = time.perf_counter()
+    assert bad_emails(emails) == [10000]
+    assert bad_emails(["not an email"] + emails) == [0, 10001]
+    assert time.perf_counter() - start < 1
+
+
+def test_import_with_one_bad_email(workdir):
+    rows = [f"user{i},050{i:07},,user{i}@mail.com," for i in range(15)]
+    rows.insert(10, "bad,0501234567,,bad email,")
+    csv_file = workdir / "contacts.csv"
+    csv_file.write_text("name,phones,birthday,email,adress\n" + "\n".join(rows) + "\n")
+    result = import_file(AddressBook(), csv_file)
+    assert (result.imported, result.errors) == (15, [(12, "wrong email bad email")])